@@ -0,0 +1,118 @@
+import json
+import os
+
+import zoritori.batch as batch
+from tests.test_pipeline import FakeRecognizer, _options
+
+
+class CountingRecognizer(FakeRecognizer):
+    def __init__(self, text="兵士"):
+        super().__init__(text)
+        self.seen = []
+
+    def recognize(self, filename, context, cancel=None, settings=None):
+        self.seen.append(os.path.basename(filename))
+        if "junk" in filename:
+            return FakeRecognizer("|l1-", conf=30.0).recognize(filename, context)
+        return super().recognize(filename, context, cancel, settings)
+
+
+def _images(root, *names):
+    for name in names:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"")
+
+
+def test_batch_writes_records_vocabulary_and_summary(tmp_path):
+    _images(tmp_path, "a.png", "sub/b.jpg", "junk.png", "notes.txt")
+    recognizer = CountingRecognizer()
+
+    summary = batch.Batch(
+        _options(False), tmp_path, workers=1, recognizer=recognizer
+    ).run()
+
+    out = tmp_path / "zoritori"
+    record = json.loads((out / "sub" / "b.jpg.json").read_text(encoding="utf-8"))
+    assert record["image"] == os.path.join("sub", "b.jpg")
+    assert record["text"] == "兵士"
+    assert [t["surface"] for t in record["tokens"]] == ["兵士"]
+    assert record["tokens"][0]["reading"] == "へいし"
+    assert record["tokens"][0]["box"] == [0, 10, 40, 30]
+    assert json.loads((out / "junk.png.json").read_text())["rejected"]
+
+    vocabulary = json.loads((out / "vocabulary.json").read_text(encoding="utf-8"))
+    assert vocabulary == {"兵士": 2}
+    assert summary["images"] == 3
+    assert summary["processed"] == 3
+    assert summary["rejected"] == 1
+    assert summary["words"] == 1
+    assert json.loads((out / "summary.json").read_text()) == summary
+
+
+def test_batch_keeps_images_with_the_same_stem_apart(tmp_path):
+    _images(tmp_path, "a.png", "a.jpg")
+    recognizer = CountingRecognizer()
+    batch.Batch(_options(False), tmp_path, workers=1, recognizer=recognizer).run()
+
+    out = tmp_path / "zoritori"
+    assert json.loads((out / "a.png.json").read_text())["image"] == "a.png"
+    assert json.loads((out / "a.jpg.json").read_text())["image"] == "a.jpg"
+    recognizer.seen = []
+    summary = batch.Batch(
+        _options(False), tmp_path, workers=1, recognizer=recognizer
+    ).run()
+    assert recognizer.seen == []
+    assert summary["skipped"] == 2
+
+
+def test_batch_with_debug(tmp_path):
+    _images(tmp_path, "a.png")
+    options = _options(False)
+    options.debug = True
+
+    summary = batch.Batch(
+        options, tmp_path, workers=1, recognizer=CountingRecognizer()
+    ).run()
+    assert summary["processed"] == 1
+    assert summary["failed"] == 0
+
+
+def test_batch_resumes(tmp_path):
+    _images(tmp_path, "a.png", "b.png")
+    batch.Batch(
+        _options(False), tmp_path, workers=1, recognizer=CountingRecognizer()
+    ).run()
+    _images(tmp_path, "c.png")
+    recognizer = CountingRecognizer()
+
+    summary = batch.Batch(
+        _options(False), tmp_path, workers=1, recognizer=recognizer
+    ).run()
+
+    assert recognizer.seen == ["c.png"]
+    assert summary["skipped"] == 2
+    assert summary["processed"] == 1
+    # vocabulary still counts the images from the first run:
+    vocabulary = json.loads((tmp_path / "zoritori" / "vocabulary.json").read_text())
+    assert vocabulary == {"兵士": 3}
+
+
+def test_batch_translates_in_batches(tmp_path, monkeypatch):
+    calls = []
+
+    def translate_many(texts, url, key):
+        calls.append(list(texts))
+        return [f"{t}!" for t in texts]
+
+    monkeypatch.setattr(batch.translator, "translate_many", translate_many)
+    monkeypatch.setattr(batch, "TRANSLATE_BATCH", 2)
+    _images(tmp_path, "a.png", "b.png", "c.png", "junk.png")
+
+    batch.Batch(
+        _options(True), tmp_path, workers=1, recognizer=CountingRecognizer()
+    ).run()
+
+    assert calls == [["兵士", "兵士"], ["兵士"]]
+    record = json.loads((tmp_path / "zoritori" / "c.png.json").read_text())
+    assert record["translation"] == "兵士!"
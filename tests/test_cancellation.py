@@ -0,0 +1,49 @@
+import stat
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from zoritori.cancellation import Cancelled, CancellationToken
+from zoritori.recognizers.tesseract import Recognizer
+
+
+def test_cancel_runs_callbacks_once():
+    token = CancellationToken()
+    calls = []
+    token.on_cancel(lambda: calls.append("a"))
+    token.check()
+    token.cancel()
+    token.cancel()
+    token.on_cancel(lambda: calls.append("b"))
+    assert calls == ["a", "b"]
+    with pytest.raises(Cancelled):
+        token.check()
+
+
+def test_result_returns_value():
+    future = Future()
+    future.set_result("軍団")
+    assert CancellationToken().result(future) == "軍団"
+
+
+def test_result_abandons_pending_future():
+    token = CancellationToken()
+    future = Future()
+    threading.Timer(0.05, token.cancel).start()
+    with pytest.raises(Cancelled):
+        token.result(future)
+    assert future.cancelled()
+
+
+def test_cancel_kills_tesseract(tmp_path):
+    fake = tmp_path / "tesseract"
+    fake.write_text("#!/bin/sh\nexec sleep 10\n")
+    fake.chmod(fake.stat().st_mode | stat.S_IEXEC)
+    token = CancellationToken()
+    threading.Timer(0.1, token.cancel).start()
+    start = time.perf_counter()
+    with pytest.raises(Cancelled):
+        Recognizer(str(fake)).recognize(tmp_path / "frame.png", cancel=token)
+    assert time.perf_counter() - start < 5
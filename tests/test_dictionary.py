@@ -0,0 +1,225 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from zoritori.cache import LRUCache, DiskCache, MISSING
+from zoritori.dictionary import DictionaryService, HttpBackend, JamdictBackend
+
+
+class CountingBackend:
+    def __init__(self, entries):
+        self.entries = entries
+        self.fetched = []
+
+    def lookup(self, s):
+        self.fetched.append(s)
+        return self.entries.get(s)
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.hits == 3
+    assert cache.misses == 1
+
+
+def test_lookup_cached():
+    backend = CountingBackend({"軍団": ["軍団", "ぐんだん", "army corps/corps"]})
+    service = DictionaryService(backend)
+    assert service.lookup("軍団") == ["軍団", "ぐんだん", "army corps/corps"]
+    assert service.lookup("軍団") == ["軍団", "ぐんだん", "army corps/corps"]
+    assert backend.fetched == ["軍団"]
+
+
+def test_lookup_caches_missing_words():
+    backend = CountingBackend({})
+    service = DictionaryService(backend)
+    assert service.lookup("ぬ") is None
+    assert service.lookup("ぬ") is None
+    assert backend.fetched == ["ぬ"]
+
+
+def test_prefetch():
+    backend = CountingBackend({"戦闘": ["戦闘"], "軍団": ["軍団"]})
+    service = DictionaryService(backend)
+    service.prefetch(["戦闘", "軍団", "戦闘"])
+    deadline = time.monotonic() + 5
+    while len(service.cache) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert service.lookup("軍団") == ["軍団"]
+    assert sorted(backend.fetched) == ["戦闘", "軍団"]
+
+
+JISHO_RESPONSE = {
+    "data": [
+        {
+            "japanese": [{"word": "軍団", "reading": "ぐんだん"}],
+            "senses": [{"english_definitions": ["army corps", "corps"]}],
+        }
+    ]
+}
+
+
+class StubJishoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        query = parse_qs(urlsplit(self.path).query)
+        server.requests.append((query["keyword"][0], self.client_address))
+        time.sleep(server.delay)
+        if server.status != 200:
+            body = b"error"
+        elif query["keyword"][0] == "軍団":
+            body = json.dumps(JISHO_RESPONSE).encode()
+        else:
+            body = json.dumps({"data": []}).encode()
+        self.send_response(server.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubJishoHandler)
+    server.requests = []
+    server.delay = 0
+    server.status = 200
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_port}/api/v1/search/words"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_http_backend_lookup(stub_server):
+    backend = HttpBackend(stub_server.url)
+    assert backend.lookup("軍団") == ["軍団", "ぐんだん", "army corps"]
+    assert backend.lookup("ぬ") is None
+
+
+def test_http_backend_reuses_connections(stub_server):
+    backend = HttpBackend(stub_server.url)
+    for word in ["軍団", "ぬ", "軍団"]:
+        backend.lookup(word)
+    assert len(stub_server.requests) == 3
+    assert len({address for _, address in stub_server.requests}) == 1
+
+
+def test_http_backend_coalesces_concurrent_lookups(stub_server):
+    stub_server.delay = 0.2
+    backend = HttpBackend(stub_server.url)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(backend.lookup, ["軍団"] * 4))
+    assert results == [["軍団", "ぐんだん", "army corps"]] * 4
+    assert len(stub_server.requests) == 1
+
+
+def test_http_backend_disk_cache(stub_server, tmp_path):
+    path = tmp_path / "dictionary.sqlite"
+    backend = HttpBackend(stub_server.url, cache_path=path)
+    backend.lookup("軍団")
+    backend.close()
+    backend = HttpBackend(stub_server.url, cache_path=path)
+    assert backend.lookup("軍団") == ["軍団", "ぐんだん", "army corps"]
+    assert len(stub_server.requests) == 1
+
+
+def test_http_backend_disk_cache_expires(stub_server, tmp_path):
+    path = tmp_path / "dictionary.sqlite"
+    backend = HttpBackend(stub_server.url, cache_path=path, ttl=-1)
+    backend.lookup("軍団")
+    backend.lookup("軍団")
+    assert len(stub_server.requests) == 2
+
+
+def test_http_errors_are_not_cached(stub_server):
+    stub_server.status = 500
+    service = DictionaryService(HttpBackend(stub_server.url))
+    assert service.lookup("軍団") is None
+    stub_server.status = 200
+    assert service.lookup("軍団") == ["軍団", "ぐんだん", "army corps"]
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(tmp_path / "cache.sqlite", max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", [2])
+    cache.put("c", None)
+    cache.trim()
+    assert len(cache) == 2
+    assert cache.get("a") is MISSING
+    assert cache.get("b") == [2]
+    assert cache.get("c") is None
+
+
+class BatchBackend:
+    def __init__(self, entries):
+        self.entries = entries
+        self.batches = []
+
+    def lookup(self, s):
+        return self.entries.get(s)
+
+    def lookup_many(self, words):
+        self.batches.append(list(words))
+        return {w: self.entries.get(w) for w in words}
+
+
+def test_lookup_many_deduplicates_and_uses_cache():
+    backend = BatchBackend({"戦闘": ["戦闘"], "軍団": ["軍団"]})
+    service = DictionaryService(backend)
+    service.lookup("戦闘")
+    results = service.lookup_many(["軍団", "戦闘", "軍団", "ぬ"])
+    assert results == {"軍団": ["軍団"], "戦闘": ["戦闘"], "ぬ": None}
+    assert backend.batches == [["軍団", "ぬ"]]
+    assert service.lookup_many(["軍団", "ぬ"]) == {"軍団": ["軍団"], "ぬ": None}
+    assert len(backend.batches) == 1
+
+
+def test_lookup_many_without_batch_support():
+    backend = CountingBackend({"軍団": ["軍団"]})
+    service = DictionaryService(backend)
+    assert service.lookup_many(["軍団", "ぬ", "軍団"]) == {"軍団": ["軍団"], "ぬ": None}
+    assert backend.fetched == ["軍団", "ぬ"]
+
+
+def test_http_lookup_many(stub_server, tmp_path):
+    backend = HttpBackend(stub_server.url, cache_path=tmp_path / "dictionary.sqlite")
+    backend.lookup("軍団")
+    results = backend.lookup_many(["軍団", "ぬ", "する"])
+    assert results == {"軍団": ["軍団", "ぐんだん", "army corps"], "ぬ": None, "する": None}
+    assert sorted(word for word, _ in stub_server.requests) == ["する", "ぬ", "軍団"]
+
+
+def test_http_lookup_many_skips_failures(stub_server):
+    stub_server.status = 500
+    service = DictionaryService(HttpBackend(stub_server.url))
+    assert service.lookup_many(["軍団"]) == {"軍団": None}
+    stub_server.status = 200
+    assert service.lookup_many(["軍団"]) == {"軍団": ["軍団", "ぐんだん", "army corps"]}
+
+
+def test_jamdict_lookup_many_matches_lookup():
+    pytest.importorskip("jamdict_data")
+    backend = JamdictBackend()
+    words = ["軍団", "食べる", "たべる", "する", "の", "、", "O", "eat", "食べ%"]
+    results = backend.lookup_many(words)
+    assert results == {w: backend.lookup(w) for w in words}
@@ -0,0 +1,64 @@
+from argparse import Namespace
+
+from zoritori.governor import LatencyGovernor, Level, default_levels
+
+
+def _options(**kwargs):
+    options = dict(
+        Translate=True,
+        Engine="tesseract",
+        OcrScale=1.0,
+        TesseractFastLang="jpn_fast",
+        TesseractLang="jpn",
+        TesseractPageMode=None,
+        DeferTranslation=False,
+    )
+    options.update(kwargs)
+    return Namespace(**options)
+
+
+def test_default_levels():
+    names = [level.name for level in default_levels(_options())]
+    assert names == [
+        "deferred translation",
+        "block-only OCR",
+        "downscaled OCR",
+        "fast OCR model",
+    ]
+    google = default_levels(_options(Engine="google", Translate=False))
+    assert google == []
+
+
+def test_steps_down_when_over_budget_and_back_up():
+    levels = [Level("a", {"OcrScale": 0.5}), Level("b", {"TesseractLang": "x"})]
+    governor = LatencyGovernor(400, levels, window=3)
+    options = _options()
+    for _ in range(3):
+        governor.observe(900)
+    assert governor.level == 1
+    degraded = governor.apply(options)
+    assert degraded.OcrScale == 0.5
+    assert degraded.TesseractLang == "jpn"
+    assert options.OcrScale == 1.0
+
+    for _ in range(3):
+        governor.observe(500)
+    assert governor.level == 2
+    for _ in range(3):
+        governor.observe(500)
+    assert governor.level == 2
+
+    for _ in range(3):
+        governor.observe(100)
+    assert governor.level == 1
+    for _ in range(3):
+        governor.observe(100)
+    assert governor.level == 0
+    assert governor.apply(options) is options
+
+
+def test_within_budget_stays_put():
+    governor = LatencyGovernor(400, [Level("a", {})], window=3)
+    for _ in range(10):
+        governor.observe(350)
+    assert governor.level == 0
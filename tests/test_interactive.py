@@ -0,0 +1,160 @@
+import glfw
+
+import zoritori.interactive as interactive
+import zoritori.pipeline as pipeline
+from zoritori.interactive import InteractiveLoop, View
+from tests.test_pipeline import FakeRecognizer, _options
+
+
+class FakeOverlay:
+    def __init__(self, pos=None):
+        self.pos = pos
+        self.draws = 0
+        self.clears = 0
+
+    def draw(self, fn):
+        self.draws += 1
+
+    def clear(self, block=False):
+        self.clears += 1
+
+    def get_mouse_pos(self):
+        return self.pos
+
+
+class FakeWatcher:
+    def __init__(self):
+        self.requests = []
+
+    def set_primary_clip(self, clip):
+        self.requests.append(("primary", clip))
+
+    def set_secondary_clip(self, clip):
+        self.requests.append(("secondary", clip))
+
+    def refresh(self):
+        self.requests.append(("refresh", None))
+
+
+class FakeEvent:
+    def __init__(self, key, clip=None):
+        self.key = key
+        self.clip = clip
+
+    def get_key(self):
+        return self.key
+
+    def get_clip(self):
+        return self.clip
+
+
+def _sdata():
+    return pipeline.process_image_light("frame.png", _options(False), FakeRecognizer())
+
+
+def _loop(overlay, monkeypatch):
+    monkeypatch.setattr(interactive.dictionary, "lookup", lambda s: [s])
+    options = _options(False)
+    options.FuriganaSize = 12
+    view = View(options, overlay)
+    watcher = FakeWatcher()
+    return InteractiveLoop(options, None, overlay, view, watcher), view, watcher
+
+
+def test_view_only_draws_with_results():
+    overlay = FakeOverlay()
+    view = View(_options(False), overlay)
+    view.set_hover(None, None)
+    view.redraw()
+    assert overlay.draws == 0
+
+    view.publish(None, _sdata())
+    assert overlay.draws == 1
+
+
+def test_view_reset_keeps_latest_for_hover():
+    overlay = FakeOverlay()
+    view = View(_options(False), overlay)
+    sdata = _sdata()
+    view.publish(None, sdata)
+    view.reset()
+
+    assert view.snapshot().primary_data is None
+    assert view.latest is sdata
+    view.publish_secondary(None, ["兵士"])
+    assert view.snapshot().primary_data is sdata
+
+
+def test_view_partial_results_are_not_kept():
+    overlay = FakeOverlay()
+    view = View(_options(False), overlay)
+    view.publish_partial(None, _sdata())
+
+    assert overlay.draws == 1
+    assert view.latest is None
+    assert view.snapshot().primary_data is None
+
+
+def test_hover_looks_up_token_and_redraws(monkeypatch):
+    overlay = FakeOverlay(pos=(5, 20))
+    loop, view, _ = _loop(overlay, monkeypatch)
+    view.publish(None, _sdata())
+    draws = overlay.draws
+
+    loop._update_hover()
+    state = view.snapshot()
+    assert state.hover is not None
+    assert state.hover_lookup == [state.hover.surface()]
+    assert overlay.draws == draws + 1
+
+    # an unchanged hover doesn't redraw:
+    loop._update_hover()
+    assert overlay.draws == draws + 1
+
+
+def test_hover_without_results_does_nothing(monkeypatch):
+    overlay = FakeOverlay(pos=(5, 20))
+    loop, view, _ = _loop(overlay, monkeypatch)
+
+    loop._update_hover()
+    assert view.snapshot().hover is None
+    assert overlay.draws == 0
+
+
+def test_clip_events_go_to_watcher(monkeypatch):
+    loop, _, watcher = _loop(FakeOverlay(), monkeypatch)
+
+    loop._handle_event(FakeEvent(glfw.MOUSE_BUTTON_1, clip="primary clip"))
+    loop._handle_event(FakeEvent(glfw.KEY_Q, clip="secondary clip"))
+    loop._handle_event(FakeEvent(glfw.KEY_T))
+
+    assert watcher.requests == [
+        ("primary", "primary clip"),
+        ("secondary", "secondary clip"),
+        ("refresh", None),
+    ]
+
+
+def test_clear_key_refreshes(monkeypatch):
+    overlay = FakeOverlay()
+    loop, _, watcher = _loop(overlay, monkeypatch)
+
+    loop._handle_event(FakeEvent(glfw.KEY_C))
+
+    assert overlay.clears == 1
+    assert watcher.requests == [("refresh", None)]
+
+
+def test_display_keys_redraw_without_reprocessing(monkeypatch):
+    overlay = FakeOverlay()
+    loop, view, watcher = _loop(overlay, monkeypatch)
+    view.publish(None, _sdata())
+    draws = overlay.draws
+
+    loop._handle_event(FakeEvent(glfw.KEY_D))
+    loop._handle_event(FakeEvent(glfw.KEY_EQUAL))
+
+    assert overlay.draws == draws + 2
+    assert loop._options.debug
+    assert loop._options.FuriganaSize == 13
+    assert watcher.requests == []
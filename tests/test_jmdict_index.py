@@ -0,0 +1,76 @@
+import sqlite3
+
+import pytest
+
+from zoritori.jmdict_index import build_index, JMdictIndex
+
+SCHEMA = """
+CREATE TABLE Entry (idseq INTEGER NOT NULL UNIQUE);
+CREATE TABLE Kanji (ID INTEGER PRIMARY KEY, idseq INTEGER, text TEXT);
+CREATE TABLE Kana (ID INTEGER PRIMARY KEY, idseq INTEGER, text TEXT, nokanji BOOLEAN);
+CREATE TABLE Sense (ID INTEGER PRIMARY KEY, idseq INTEGER);
+CREATE TABLE SenseGloss (sid INTEGER, lang TEXT, gend TEXT, text TEXT);
+"""
+
+
+@pytest.fixture
+def index(tmp_path):
+    db = tmp_path / "jamdict.db"
+    conn = sqlite3.connect(db)
+    conn.executescript(SCHEMA)
+    conn.executemany("INSERT INTO Entry VALUES (?)", [(100,), (200,), (300,)])
+    conn.executemany(
+        "INSERT INTO Kanji (idseq, text) VALUES (?, ?)",
+        [(100, "軍団"), (200, "食べる"), (200, "喰べる")],
+    )
+    conn.executemany(
+        "INSERT INTO Kana (idseq, text) VALUES (?, ?)",
+        [(100, "ぐんだん"), (200, "たべる"), (300, "たべる"), (300, "する")],
+    )
+    conn.executemany(
+        "INSERT INTO Sense (ID, idseq) VALUES (?, ?)", [(1, 100), (2, 100), (3, 200)]
+    )
+    conn.executemany(
+        "INSERT INTO SenseGloss VALUES (?, ?, ?, ?)",
+        [
+            (1, "eng", None, "army corps"),
+            (1, "eng", None, "corps"),
+            (2, "eng", None, "second sense"),
+            (3, "eng", None, "to eat"),
+        ],
+    )
+    conn.commit()
+    conn.close()
+    path = build_index(tmp_path / "jmdict.idx", db)
+    index = JMdictIndex(path)
+    yield index
+    index.close()
+
+
+def test_lookup_kanji(index):
+    assert index.lookup("軍団") == ["軍団", "ぐんだん", "army corps/corps"]
+
+
+def test_lookup_kana_prefers_first_entry(index):
+    assert index.lookup("たべる") == ["食べる", "たべる", "to eat"]
+
+
+def test_lookup_alternate_form(index):
+    assert index.lookup("喰べる") == ["食べる", "たべる", "to eat"]
+
+
+def test_lookup_entry_without_kanji_or_senses(index):
+    assert index.lookup("する") == ["たべる"]
+
+
+def test_lookup_missing(index):
+    assert index.lookup("ぬ") is None
+    assert index.lookup("") is None
+    assert len(index) == 6
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "other.idx"
+    path.write_bytes(b"not an index" * 10)
+    with pytest.raises(ValueError):
+        JMdictIndex(path)
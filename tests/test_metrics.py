@@ -0,0 +1,49 @@
+import json
+
+from zoritori.metrics import Histogram, Registry
+
+
+def test_histogram_quantiles():
+    h = Histogram()
+    for ms in [1, 3, 3, 8, 40, 400]:
+        h.observe(ms)
+    assert h.count == 6
+    assert h.quantile(0.5) == 5
+    assert h.quantile(0.95) == 400
+    assert h.max == 400
+    assert h.counts[-1] == 0
+
+
+def test_histogram_overflow_bucket():
+    h = Histogram(bounds=(10,))
+    h.observe(25)
+    assert h.counts == [0, 1]
+    assert h.quantile(0.5) == 25
+
+
+def test_registry_timer_and_counters():
+    registry = Registry()
+    with registry.timer("recognize"):
+        pass
+    registry.incr("frames_processed")
+    registry.incr("frames_processed", 2)
+    snapshot = registry.snapshot()
+    assert snapshot["latency"]["recognize"]["count"] == 1
+    assert snapshot["counters"] == {"frames_processed": 3}
+
+
+def test_registry_writes_json_and_prometheus(tmp_path):
+    registry = Registry()
+    registry.observe("translate", 120)
+    registry.incr("frames_dropped")
+
+    registry.write(tmp_path / "metrics.json")
+    data = json.loads((tmp_path / "metrics.json").read_text())
+    assert data["latency"]["translate"]["p50_ms"] == 120
+
+    registry.write(tmp_path / "metrics.prom")
+    text = (tmp_path / "metrics.prom").read_text()
+    assert "zoritori_frames_dropped_total 1" in text
+    assert 'zoritori_translate_ms_bucket{le="200"} 1' in text
+    assert 'zoritori_translate_ms_bucket{le="100"} 0' in text
+    assert "zoritori_translate_ms_count 1" in text
@@ -0,0 +1,30 @@
+import sys
+from pathlib import Path
+
+from zoritori.options import get_options
+
+
+ROOT = Path(__file__).parent.parent
+
+
+def test_shipped_config_parses(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setattr(sys, "argv", ["zoritori", "-c", str(ROOT / "config.ini")])
+    options = get_options()
+    assert options.command == "ui"
+    assert options.TesseractPageMode is None
+    assert options.OcrScale == 1.0
+
+
+def test_batch_command(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["zoritori", "-c", str(ROOT / "config.ini"), "--TesseractPageMode", "6"]
+        + ["batch", "screenshots"],
+    )
+    options = get_options()
+    assert options.command == "batch"
+    assert options.input == "screenshots"
+    assert options.TesseractPageMode == 6
@@ -0,0 +1,243 @@
+from argparse import Namespace
+import queue
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+import zoritori.pipeline as pipeline
+from zoritori.types import Box, CharacterData, BlockData, RawData
+
+
+class FakeRecognizer:
+    def __init__(self, text="兵士", conf=90.0):
+        self.text = text
+        self.conf = conf
+
+    def recognize(self, filename, context, cancel=None, settings=None):
+        line = [
+            CharacterData(c, 0, self.conf, Box(i * 20, 10, 20, 30, context))
+            for i, c in enumerate(self.text)
+        ]
+        return RawData([line], [BlockData([line], Box(0, 10, 40, 30))])
+
+
+def _options(translate):
+    return Namespace(
+        debug=False,
+        Translate=translate,
+        DeepLUrl="",
+        DeepLKey="",
+        NotesFolder=None,
+        MinConfidence=50.0,
+        MaxAsciiRatio=0.25,
+        MinJapaneseRatio=0.5,
+        MinCharacters=1,
+        TesseractLang="jpn",
+        TesseractPageMode=None,
+        OcrScale=1.0,
+        DeferTranslation=False,
+    )
+
+
+def test_progressive_updates(monkeypatch):
+    translation = Future()
+    monkeypatch.setattr(pipeline, "translate_async", lambda *args: translation)
+    updates = []
+
+    def on_update(rich_data):
+        updates.append(rich_data)
+        if len(updates) == 2:
+            translation.set_result("soldier")
+
+    rich_data = pipeline.process_image_light(
+        "frame.png", _options(True), FakeRecognizer(), on_update=on_update
+    )
+    assert [(u.original, u.translation, len(u.tokens)) for u in updates] == [
+        ("兵士", None, 0),
+        ("兵士", None, 1),
+    ]
+    assert rich_data.translation == "soldier"
+    assert [t.surface() for t in rich_data.tokens] == ["兵士"]
+
+
+def test_no_token_update_without_translation():
+    updates = []
+    rich_data = pipeline.process_image_light(
+        "frame.png", _options(False), FakeRecognizer(), on_update=updates.append
+    )
+    assert len(updates) == 1
+    assert rich_data.translation is None
+
+
+def test_staged_pipeline():
+    results = queue.Queue()
+    updates = []
+    staged = pipeline.build_pipeline(
+        _options(False), FakeRecognizer(), results.put, on_update=updates.append
+    )
+    staged.submit(pipeline.Frame("frame.png", None, None))
+    rich_data = results.get(timeout=5)
+    assert [t.surface() for t in rich_data.tokens] == ["兵士"]
+    assert len(updates) == 1
+    staged.stop()
+
+
+def test_new_frame_cancels_frame_in_flight():
+    started = threading.Event()
+    tokens = []
+
+    class SlowRecognizer(FakeRecognizer):
+        def recognize(self, filename, context, cancel=None, settings=None):
+            if filename == "old.png":
+                tokens.append(cancel)
+                started.set()
+                cancel.result(Future())
+            return super().recognize(filename, context, cancel, settings)
+
+    results = queue.Queue()
+    staged = pipeline.build_pipeline(_options(False), SlowRecognizer(), results.put)
+    staged.submit(pipeline.Frame("old.png", None, None))
+    assert started.wait(5)
+    staged.submit(pipeline.Frame("new.png", None, None))
+    assert results.get(timeout=5).original == "兵士"
+    assert tokens[0].cancelled
+    assert staged.stats()["recognize"]["cancelled"] == 1
+    staged.stop()
+
+
+def test_junk_is_rejected_before_translation(monkeypatch):
+    monkeypatch.setattr(pipeline, "translate_async", pytest.fail)
+    rich_data = pipeline.process_image_light(
+        "frame.png", _options(True), FakeRecognizer("|l1-", conf=30.0)
+    )
+    assert rich_data is None
+
+
+def test_staged_pipeline_reports_rejects():
+    rejects = queue.Queue()
+    staged = pipeline.build_pipeline(
+        _options(False),
+        FakeRecognizer("兵士", conf=20.0),
+        pytest.fail,
+        on_reject=rejects.put,
+    )
+    staged.submit(pipeline.Frame("frame.png", None, None))
+    rejected = rejects.get(timeout=5)
+    assert rejected.quality.reasons == ["median confidence 20"]
+    assert rejected.tokens == []
+    assert staged.stats()["recognize"]["filtered"] == 1
+    staged.stop()
+
+
+def test_deferred_translation_published_later(monkeypatch):
+    translation = Future()
+    monkeypatch.setattr(pipeline, "translate_async", lambda *args: translation)
+    options = _options(True)
+    options.DeferTranslation = True
+    results = queue.Queue()
+    staged = pipeline.build_pipeline(options, FakeRecognizer(), results.put)
+    staged.submit(pipeline.Frame("frame.png", None, None))
+    first = results.get(timeout=5)
+    assert first.translation is None
+    assert [t.surface() for t in first.tokens] == ["兵士"]
+    translation.set_result("soldier")
+    assert results.get(timeout=5).translation == "soldier"
+    staged.stop()
+
+
+def test_deferred_translation_goes_to_on_translation(monkeypatch):
+    translation = Future()
+    monkeypatch.setattr(pipeline, "translate_async", lambda *args: translation)
+    options = _options(True)
+    options.DeferTranslation = True
+    results = queue.Queue()
+    translations = queue.Queue()
+    staged = pipeline.build_pipeline(
+        options, FakeRecognizer(), results.put, on_translation=translations.put
+    )
+    staged.submit(pipeline.Frame("frame.png", None, None))
+    assert results.get(timeout=5).translation is None
+    translation.set_result("soldier")
+    assert translations.get(timeout=5).translation == "soldier"
+    assert results.empty()
+    staged.stop()
+
+
+def test_late_translation_is_dropped_after_newer_frame(monkeypatch):
+    translations = {"兵士": Future(), "軍団": Future()}
+    monkeypatch.setattr(
+        pipeline, "translate_async", lambda text, *args: translations[text]
+    )
+    options = _options(True)
+    options.DeferTranslation = True
+
+    class Recognizer(FakeRecognizer):
+        def recognize(self, filename, context, cancel=None, settings=None):
+            self.text = "兵士" if filename == "old.png" else "軍団"
+            return super().recognize(filename, context, cancel, settings)
+
+    results = queue.Queue()
+    staged = pipeline.build_pipeline(options, Recognizer(), results.put)
+    staged.submit(pipeline.Frame("old.png", None, None))
+    assert results.get(timeout=5).original == "兵士"
+    staged.submit(pipeline.Frame("new.png", None, None))
+    assert results.get(timeout=5).original == "軍団"
+
+    translations["兵士"].set_result("soldier")
+    translations["軍団"].set_result("army")
+    newest = results.get(timeout=5)
+    assert (newest.original, newest.translation) == ("軍団", "army")
+    assert results.empty()
+    staged.stop()
+
+
+class FakeDictionary:
+    def __init__(self, words):
+        self.words = words
+        self.looked_up = []
+
+    def lookup(self, s):
+        self.looked_up.append(s)
+        return self.words.get(s)
+
+    def lookup_many(self, words):
+        self.looked_up.append(list(words))
+        return {w: self.words.get(w) for w in words}
+
+
+def test_quick_lookup_uses_single_line_ocr_without_translating(monkeypatch):
+    monkeypatch.setattr(pipeline, "translate_async", pytest.fail)
+    fake = FakeDictionary({"兵士": ["兵士", "へいし", "soldier"]})
+    monkeypatch.setattr(pipeline, "dictionary", fake)
+    seen = []
+
+    class Recognizer(FakeRecognizer):
+        def recognize(self, filename, context, cancel=None, settings=None):
+            seen.append(settings)
+            return super().recognize(filename, context, cancel, settings)
+
+    lookup = pipeline.quick_lookup("clip.png", _options(True), Recognizer())
+    assert lookup == ["兵士", "へいし", "soldier"]
+    assert seen[0].page_mode == pipeline.SINGLE_LINE_PAGE_MODE
+    # found directly, so never tokenized or batched:
+    assert fake.looked_up == ["兵士"]
+
+
+def test_quick_lookup_batches_tokens_when_not_a_word(monkeypatch):
+    fake = FakeDictionary({"兵士": ["兵士", "へいし", "soldier"], "走る": ["走る", "はしる", None]})
+    monkeypatch.setattr(pipeline, "dictionary", fake)
+
+    lookup = pipeline.quick_lookup(
+        "clip.png", _options(False), FakeRecognizer("兵士が走る。")
+    )
+    assert lookup == ["兵士 | へいし | soldier", "走る | はしる"]
+    assert fake.looked_up[0] == "兵士が走る。"
+    assert fake.looked_up[1] == ["兵士", "が", "走る"]
+
+
+def test_quick_lookup_of_nothing(monkeypatch):
+    monkeypatch.setattr(pipeline, "dictionary", FakeDictionary({}))
+    assert (
+        pipeline.quick_lookup("clip.png", _options(False), FakeRecognizer("")) is None
+    )
@@ -0,0 +1,56 @@
+import json
+import threading
+
+import zoritori.profiling as profiling
+from zoritori.profiling import SessionProfiler, compare
+
+
+def tokenize_stage(n):
+    return sum(i * i for i in range(n))
+
+
+def test_session_profile_reports(tmp_path):
+    profiler = SessionProfiler(tmp_path, memory_interval=0.05).start()
+
+    def worker():
+        with profiler.thread_scope():
+            tokenize_stage(10_000)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    folder = profiler.stop()
+
+    assert folder.parent == tmp_path
+    summary = json.loads((folder / "summary.json").read_text())
+    assert summary["stages"]["tokenize"]["calls"] == 1
+    assert len(summary["memory"]["timeline"]) >= 2
+    assert "tokenize_stage" in (folder / "functions.txt").read_text()
+    assert "allocation hotspots" in (folder / "memory.txt").read_text()
+    assert (folder / "session.pstats").exists()
+
+
+def test_thread_scope_without_profiler():
+    with profiling.thread_scope():
+        pass
+    assert profiling.stop() is None
+
+
+def test_compare_summaries(tmp_path):
+    def summary(path, seconds, peak):
+        path.write_text(
+            json.dumps(
+                {
+                    "stages": {"recognize": {"calls": 10, "cumulative_s": seconds}},
+                    "memory": {"timeline": [{"peak_kb": peak}]},
+                }
+            )
+        )
+        return path
+
+    before = summary(tmp_path / "a.json", 2.0, 1000)
+    after = summary(tmp_path / "b.json", 1.5, 1200)
+    lines = compare(before, after)
+    assert lines[0].startswith("recognize")
+    assert "(-50.00ms)" in lines[0]
+    assert "(+200KiB)" in lines[1]
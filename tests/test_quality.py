@@ -0,0 +1,43 @@
+import numpy as np
+
+from zoritori.quality import QualityGate
+
+
+def test_accepts_japanese():
+    report = QualityGate().assess(np.array([90.0, 80.0, 95.0]), "兵士が\nｶﾀ")
+    assert report.ok
+    assert report.characters == 5
+    assert report.median_confidence == 90.0
+    assert report.japanese_ratio == 1.0
+
+
+def test_rejects_junk():
+    report = QualityGate().assess(np.array([30.0, 40.0, 20.0, 90.0]), "|l1兵")
+    assert not report.ok
+    assert report.ascii_ratio == 0.75
+    assert report.reasons == ["median confidence 35", "75% ascii", "25% kana/kanji"]
+
+
+def test_rejects_empty():
+    report = QualityGate().assess(np.array([]), "\n")
+    assert report.reasons == ["0 characters", "median confidence 0"]
+
+
+def test_checks_can_be_disabled():
+    gate = QualityGate(
+        min_confidence=0, max_ascii_ratio=1, min_japanese_ratio=0, min_characters=0
+    )
+    assert gate.assess(np.array([5.0]), "abc").ok
+
+
+def test_accepts_short_bracketed_lines():
+    gate = QualityGate()
+    for text in ["「はい。」", "「え？」", "……！", "「兵士、\n退却！」"]:
+        report = gate.assess(np.array([90.0]), text)
+        assert report.ok, (text, report.reasons)
+        assert report.japanese_ratio == 1.0
+
+
+def test_punctuation_does_not_hide_junk():
+    report = QualityGate(max_ascii_ratio=1).assess(np.array([90.0]), "「abc」")
+    assert report.reasons == ["0% kana/kanji"]
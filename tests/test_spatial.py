@@ -0,0 +1,62 @@
+import pytest
+
+from zoritori.spatial import TokenIndex
+from zoritori.tokenizer import tokenize
+from zoritori.types import Box, CharacterData, Root
+
+
+lines = ["戦闘不能となるのは", "兵士数がOになった"]
+
+
+def _ldata(lines, context):
+    return [
+        [
+            CharacterData(
+                c, line_num, 90.0, Box(i * 20, line_num * 30, 20, 30, context)
+            )
+            for i, c in enumerate(line)
+        ]
+        for line_num, line in enumerate(lines)
+    ]
+
+
+@pytest.fixture
+def tokens():
+    context = Root(500, 500, 100, 200)
+    return tokenize("\n".join(lines), _ldata(lines, context))
+
+
+def _brute_force(tokens, x, y):
+    for t in tokens:
+        box = t.box()
+        if box.clientx <= x < box.clientx + box.width:
+            if box.clienty <= y < box.clienty + box.height:
+                return t
+    return None
+
+
+def test_find(tokens):
+    index = TokenIndex(tokens)
+    assert len(index) == len(tokens)
+    assert index.find(105, 205).surface() == "戦闘"
+    assert index.find(125, 231).surface() == "兵士"
+    assert index.find(100 + 20 * 4 + 1, 231).surface() == "O"
+
+
+def test_find_outside(tokens):
+    index = TokenIndex(tokens)
+    assert index.find(99, 205) is None
+    assert index.find(105, 199) is None
+    assert index.find(105, 260) is None
+    assert index.find(100 + 20 * 9, 205) is None
+
+
+def test_find_matches_brute_force(tokens):
+    index = TokenIndex(tokens)
+    for x in range(90, 300, 7):
+        for y in range(190, 270, 5):
+            assert index.find(x, y) is _brute_force(tokens, x, y)
+
+
+def test_find_empty():
+    assert TokenIndex([]).find(0, 0) is None
@@ -0,0 +1,111 @@
+import threading
+import time
+from dataclasses import dataclass
+
+import pytest
+
+import zoritori.metrics as metrics
+from zoritori.stages import Filtered, LatestQueue, Stage, StagedPipeline
+
+
+@dataclass
+class Item:
+    name: str
+    seq: int = -1
+
+
+def _wait_idle(pipeline, timeout=5):
+    deadline = time.monotonic() + timeout
+    while pipeline.busy() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not pipeline.busy()
+
+
+def test_latest_queue_drops_oldest():
+    q = LatestQueue(maxsize=1)
+    assert q.put("a") is None
+    assert q.put("b") == "a"
+    assert q.dropped == 1
+    assert q.get() == "b"
+    q.close()
+    assert q.get() is None
+
+
+def test_pipeline_runs_items_through_stages():
+    results = []
+    stages = [
+        Stage("upper", lambda item: Item(item.name.upper(), item.seq)),
+        Stage("suffix", lambda item: Item(item.name + "!", item.seq)),
+    ]
+    pipeline = StagedPipeline(stages, results.append)
+    pipeline.submit(Item("a"))
+    _wait_idle(pipeline)
+    assert results == [Item("A!", 0)]
+    pipeline.stop()
+
+
+def test_pipeline_keeps_newest_when_behind():
+    release = threading.Event()
+    results = []
+
+    def slow(item):
+        release.wait(5)
+        return item
+
+    pipeline = StagedPipeline([Stage("slow", slow)], results.append)
+    for name in "abcd":
+        pipeline.submit(Item(name))
+        time.sleep(0.02)
+    release.set()
+    _wait_idle(pipeline)
+    # a was already running, b and c were displaced by d:
+    assert [item.name for item in results] == ["a", "d"]
+    assert pipeline.stats()["slow"]["dropped"] == 2
+    pipeline.stop()
+
+
+def test_pipeline_drops_results_overtaken_by_newer_items():
+    results = []
+
+    def work(item):
+        time.sleep(0.3 if item.name == "slow" else 0)
+        return item
+
+    pipeline = StagedPipeline([Stage("work", work, workers=2)], results.append)
+    pipeline.submit(Item("slow"))
+    time.sleep(0.05)
+    pipeline.submit(Item("fast"))
+    _wait_idle(pipeline)
+    assert [item.name for item in results] == ["fast"]
+    assert pipeline.stats()["work"]["stale"] == 1
+    pipeline.stop()
+
+
+def test_pipeline_survives_failing_stage():
+    results = []
+
+    def work(item):
+        if item.name == "bad":
+            raise ValueError(item.name)
+        return item
+
+    pipeline = StagedPipeline([Stage("work", work)], results.append)
+    pipeline.submit(Item("bad"))
+    _wait_idle(pipeline)
+    pipeline.submit(Item("good"))
+    _wait_idle(pipeline)
+    assert [item.name for item in results] == ["good"]
+    pipeline.stop()
+
+
+def test_filtered_items_are_not_dropped():
+    def reject(item):
+        raise Filtered()
+
+    before = metrics.snapshot()["counters"].get("frames_dropped", 0)
+    pipeline = StagedPipeline([Stage("reject", reject)], pytest.fail)
+    pipeline.submit(Item("a"))
+    _wait_idle(pipeline)
+    assert pipeline.stats()["reject"]["filtered"] == 1
+    assert metrics.snapshot()["counters"].get("frames_dropped", 0) == before
+    pipeline.stop()
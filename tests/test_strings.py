@@ -25,3 +25,18 @@ def test_all_kana():
 
 def test_not_all_kana():
     assert not s.all_kana("赤")
+
+
+def test_normalize_japanese_folds_width_and_whitespace():
+    assert s.normalize_japanese("ｶﾀｶﾅ　と\nＡＢＣ１") == "カタカナとABC1"
+
+
+def test_normalize_japanese_strips_punctuation():
+    assert s.normalize_japanese("「退却したとき、」|") == "退却したとき"
+    assert s.normalize_japanese("「退却したとき、」|") == s.normalize_japanese("退却したとき。")
+
+
+def test_normalize_japanese_keeps_question_and_exclamation_marks():
+    assert s.normalize_japanese("「行くの？」") == "行くの?"
+    assert s.normalize_japanese("「行くの？」") != s.normalize_japanese("「行くの。」")
+    assert s.normalize_japanese("行くの！") == "行くの!"
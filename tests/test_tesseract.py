@@ -0,0 +1,51 @@
+import stat
+
+import pytest
+import pytesseract
+from PIL import Image
+
+from zoritori.cancellation import CancellationToken
+from zoritori.recognizers.tesseract import Recognizer
+from zoritori.types import OcrSettings
+
+
+TSV = (
+    "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num"
+    "\tleft\ttop\twidth\theight\tconf\ttext\n"
+    "5\t1\t1\t1\t1\t1\t10\t20\t30\t40\t90.0\t兵\n"
+)
+
+
+def _fake_tesseract(tmp_path):
+    (tmp_path / "out.tsv").write_text(TSV, encoding="utf-8")
+    fake = tmp_path / "tesseract"
+    fake.write_text(
+        f'#!/bin/sh\necho "$@" > {tmp_path}/args\ncat > /dev/null\n'
+        f"cat {tmp_path}/out.tsv\n"
+    )
+    fake.chmod(fake.stat().st_mode | stat.S_IEXEC)
+    return fake
+
+
+def test_settings_passed_to_tesseract(tmp_path):
+    fake = _fake_tesseract(tmp_path)
+    image = tmp_path / "frame.png"
+    Image.new("RGB", (100, 50)).save(image)
+    settings = OcrSettings(lang="jpn_fast", page_mode=6, scale=0.5)
+    raw_data = Recognizer(str(fake), actual_boxes=True).recognize(
+        image, cancel=CancellationToken(), settings=settings
+    )
+    args = (tmp_path / "args").read_text().split()
+    assert args == ["stdin", "stdout", "-l", "jpn_fast", "--psm", "6", "tsv"]
+    c = raw_data.lines[0][0]
+    assert c.text == "兵"
+    # boxes are mapped back to the unscaled screenshot:
+    assert (c.left, c.top, c.width, c.height) == (20, 40, 60, 80)
+
+
+def test_missing_tesseract(tmp_path):
+    image = tmp_path / "frame.png"
+    Image.new("RGB", (100, 50)).save(image)
+    recognizer = Recognizer(str(tmp_path / "missing"))
+    with pytest.raises(pytesseract.TesseractNotFoundError):
+        recognizer.recognize(image, cancel=CancellationToken())
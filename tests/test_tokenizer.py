@@ -1,3 +1,5 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from itertools import groupby
 
 import pytest
@@ -41,3 +43,93 @@ def test_merge_bug():
     tokens = t.tokenize(text)
     assert tokens[-1].surface() == "軍団"
     assert tokens[-1].has_kanji()
+
+
+def test_service_reuses_tokenizer_per_thread():
+    service = t.TokenizerService()
+    assert service.get_tokenizer() is service.get_tokenizer()
+
+
+def test_service_thread_local_tokenizers():
+    service = t.TokenizerService()
+    main = service.get_tokenizer()
+    others = []
+    thread = threading.Thread(target=lambda: others.append(service.get_tokenizer()))
+    thread.start()
+    thread.join()
+    assert others[0] is not main
+
+
+def test_service_rejects_unknown_split_mode():
+    with pytest.raises(ValueError):
+        t.TokenizerService(split_mode="D")
+
+
+def test_tokenize_from_worker_threads():
+    text = "\n".join(lines)
+    expected = [token.surface() for token in t.tokenize(text)]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda _: t.tokenize(text), range(8)))
+    for tokens in results:
+        assert [token.surface() for token in tokens] == expected
+
+
+def test_tokenize_memoized():
+    text = "まず、わしの軍団"
+    first = t.tokenize(text)
+    second = t.tokenize(text)
+    assert first is not second
+    assert [token.surface() for token in first] == [token.surface() for token in second]
+    assert t._analyze.cache_info().hits > 0
+
+
+def test_tokenize_memoized_rebinds_cdata():
+    text = lines[0]
+    t.tokenize(text)
+    ldata = [[f"<{c}>" for c in text]]
+    tokens = t.tokenize(text, ldata)
+    assert tokens[0].first() == "<戦>"
+
+
+def _summary(tokens):
+    return [
+        (token.surface(), token.line_num(), token.char_num(), token.reading_form())
+        for token in tokens
+    ]
+
+
+batch = lines + ["\n".join(lines), "羽柴秀吉と織田信長", "まず、わしの軍団"]
+
+
+def test_tokenize_many_matches_tokenize():
+    results = t.tokenize_many(batch)
+    assert len(results) == len(batch)
+    for text, tokens in zip(batch, results):
+        assert _summary(tokens) == _summary(t.tokenize(text))
+
+
+def test_tokenize_many_merges_names():
+    tokens = t.tokenize_many(["羽柴秀吉と織田信長"])[0]
+    assert [token.surface() for token in tokens] == ["羽柴秀吉", "と", "織田信長"]
+
+
+def test_tokenize_many_process_pool():
+    texts = batch * (t.POOL_MIN_TEXTS // len(batch) + 1)
+    results = t.tokenize_many(texts, processes=2)
+    for text, tokens in zip(texts, results):
+        assert _summary(tokens) == _summary(t.tokenize(text))
+
+
+def test_tokenize_many_process_pool_while_warming_up(monkeypatch):
+    service = t.TokenizerService(t.get_service().split_mode, t.get_service().edition)
+    monkeypatch.setattr(t, "_service", service)
+    service.warm_up()
+    texts = batch * (t.POOL_MIN_TEXTS // len(batch) + 1)
+    results = t.tokenize_many(texts, processes=2)
+    assert len(results) == len(texts)
+
+
+def test_token_part_of_speech_index():
+    tokens = t.tokenize(lines[0])
+    assert tokens[0].part_of_speech(0) == "名詞"
+    assert tokens[0].part_of_speech()[0] == "名詞"
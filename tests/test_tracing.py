@@ -0,0 +1,71 @@
+import json
+import threading
+
+import pytest
+
+import zoritori.tracing as tracing
+from zoritori.metrics import Registry
+from zoritori.recognizers.tesseract import _fix_line_numbers
+
+
+@pytest.fixture
+def traced():
+    tracing.configure(True, buffer_size=100)
+    yield
+    tracing.configure(False)
+
+
+def test_disabled_records_nothing():
+    assert not tracing.enabled
+    with tracing.span("recognize", seq=1):
+        tracing.instant("dropped")
+    assert tracing.events() == []
+
+
+def test_span_and_instant(traced):
+    with tracing.span("recognize", seq=1):
+        tracing.instant("dropped", seq=0)
+    events = [e for e in tracing.events() if e["ph"] != "M"]
+    assert [(e["name"], e["ph"]) for e in events] == [
+        ("dropped", "i"),
+        ("recognize", "X"),
+    ]
+    assert events[1]["args"] == {"seq": 1}
+    assert events[1]["dur"] >= 0
+
+
+def test_events_per_thread(traced):
+    thread = threading.Thread(target=tracing.instant, args=("tick",), name="worker")
+    thread.start()
+    thread.join()
+    tracing.instant("tick")
+    names = {e["args"]["name"] for e in tracing.events() if e["ph"] == "M"}
+    assert "worker" in names
+    assert len({e["tid"] for e in tracing.events() if e["ph"] == "i"}) == 2
+
+
+def test_ring_buffer_keeps_newest(traced):
+    tracing.configure(True, buffer_size=3)
+    for i in range(5):
+        tracing.instant("tick", i=i)
+    assert [e["args"]["i"] for e in tracing.events() if e["ph"] == "i"] == [2, 3, 4]
+
+
+def test_export_chrome_trace(traced, tmp_path):
+    with Registry().timer("tokenize"):
+        pass
+    path = tracing.export(tmp_path / "trace.json")
+    trace = json.loads(path.read_text())
+    assert trace["traceEvents"][-1]["name"] == "tokenize"
+
+
+def test_tesseract_line_numbers_traced(traced):
+    rows = [
+        {"conf": 90.0, "text": "兵"},
+        {"conf": -1, "text": ""},
+        {"conf": 90.0, "text": "士"},
+    ]
+    _fix_line_numbers(rows)
+    assert [r.get("line_num") for r in rows] == [1, None, 2]
+    names = [e["name"] for e in tracing.events() if e["ph"] == "i"]
+    assert names == ["set line", "line break", "skip whitespace", "set line"]
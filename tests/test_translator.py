@@ -0,0 +1,182 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+from zoritori.translator import DeepLClient, TranslationCache
+
+
+class MockDeepLHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers["Content-Length"])
+        form = parse_qs(self.rfile.read(length).decode())
+        server.requests.append((form, self.client_address))
+        time.sleep(server.delay)
+        status = server.statuses.pop(0) if server.statuses else 200
+        retry_after = server.retry_after.pop(0) if server.retry_after else None
+        if status == 200:
+            translations = [{"text": f"EN:{text}"} for text in form["text"]]
+            body = json.dumps({"translations": translations}).encode()
+        else:
+            body = b"{}"
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if retry_after is not None:
+            self.send_header("Retry-After", retry_after)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def deepl_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockDeepLHandler)
+    server.requests = []
+    server.statuses = []
+    server.delay = 0
+    server.retry_after = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_port}/v2/translate"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_translate(deepl_server):
+    client = DeepLClient(deepl_server.url, "key")
+    assert client.translate("軍団") == "EN:軍団"
+    form, _ = deepl_server.requests[0]
+    assert form["auth_key"] == ["key"]
+    assert form["source_lang"] == ["JA"]
+    assert form["target_lang"] == ["EN"]
+
+
+def test_translate_reuses_connection(deepl_server):
+    client = DeepLClient(deepl_server.url, "key")
+    for text in ["一", "二", "三"]:
+        client.translate(text)
+    assert len({address for _, address in deepl_server.requests}) == 1
+
+
+def test_translate_retries(deepl_server):
+    deepl_server.statuses = [429, 503]
+    client = DeepLClient(deepl_server.url, "key", backoff=0.01)
+    assert client.translate("軍団") == "EN:軍団"
+    assert len(deepl_server.requests) == 3
+
+
+def test_translate_gives_up(deepl_server):
+    deepl_server.statuses = [500, 500, 500]
+    client = DeepLClient(deepl_server.url, "key", retries=2, backoff=0.01)
+    assert client.translate("軍団") is None
+    assert len(deepl_server.requests) == 3
+
+
+def test_translate_honours_short_retry_after(deepl_server):
+    deepl_server.statuses = [429]
+    deepl_server.retry_after = ["0"]
+    client = DeepLClient(deepl_server.url, "key", backoff=5)
+    start = time.perf_counter()
+    assert client.translate("軍団") == "EN:軍団"
+    assert time.perf_counter() - start < 1
+
+
+def test_translate_gives_up_on_long_retry_after(deepl_server):
+    deepl_server.statuses = [429]
+    deepl_server.retry_after = ["600"]
+    client = DeepLClient(deepl_server.url, "key", max_delay=1)
+    start = time.perf_counter()
+    assert client.translate("軍団") is None
+    assert time.perf_counter() - start < 1
+    assert len(deepl_server.requests) == 1
+
+
+def test_translate_does_not_retry_client_errors(deepl_server):
+    deepl_server.statuses = [403]
+    client = DeepLClient(deepl_server.url, "key", backoff=0.01)
+    assert client.translate("軍団") is None
+    assert len(deepl_server.requests) == 1
+
+
+def test_translate_read_timeout(deepl_server):
+    deepl_server.delay = 0.5
+    client = DeepLClient(deepl_server.url, "key", read_timeout=0.1, retries=0)
+    start = time.perf_counter()
+    assert client.translate("軍団") is None
+    assert time.perf_counter() - start < 0.5
+
+
+def test_submit_returns_future(deepl_server):
+    deepl_server.delay = 0.1
+    client = DeepLClient(deepl_server.url, "key")
+    future = client.submit("軍団")
+    assert not future.done()
+    assert future.result(timeout=5) == "EN:軍団"
+
+
+def test_translation_cache_ignores_ocr_noise(deepl_server, tmp_path):
+    cache = TranslationCache(tmp_path / "translations.sqlite")
+    client = DeepLClient(deepl_server.url, "key", cache=cache)
+    assert client.translate("退却したとき、\n兵士数が") == "EN:退却したとき、\n兵士数が"
+    assert client.translate("退却したとき。兵士数が") == "EN:退却したとき、\n兵士数が"
+    assert len(deepl_server.requests) == 1
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_translation_cache_persists(deepl_server, tmp_path):
+    path = tmp_path / "translations.sqlite"
+    DeepLClient(deepl_server.url, "key", cache=TranslationCache(path)).translate("軍団")
+    client = DeepLClient(deepl_server.url, "key", cache=TranslationCache(path))
+    assert client.translate("軍団") == "EN:軍団"
+    assert len(deepl_server.requests) == 1
+
+
+def test_translation_cache_skips_failures(deepl_server):
+    deepl_server.statuses = [403]
+    client = DeepLClient(deepl_server.url, "key", cache=TranslationCache())
+    assert client.translate("軍団") is None
+    assert client.translate("軍団") == "EN:軍団"
+    assert len(deepl_server.requests) == 2
+
+
+def test_submit_batches_texts(deepl_server):
+    client = DeepLClient(deepl_server.url, "key", batch_window=0.1)
+    futures = [client.submit(text) for text in ["軍団", "兵士", "軍団"]]
+    results = [future.result(timeout=5) for future in futures]
+    assert results == ["EN:軍団", "EN:兵士", "EN:軍団"]
+    assert len(deepl_server.requests) == 1
+    form, _ = deepl_server.requests[0]
+    assert form["text"] == ["軍団", "兵士"]
+
+
+def test_translate_many_splits_large_batches(deepl_server):
+    client = DeepLClient(deepl_server.url, "key")
+    texts = [f"文{i}" for i in range(60)]
+    assert client.translate_many(texts) == [f"EN:{text}" for text in texts]
+    assert [len(form["text"]) for form, _ in deepl_server.requests] == [50, 10]
+
+
+def test_translate_many_failure(deepl_server):
+    deepl_server.statuses = [403]
+    client = DeepLClient(deepl_server.url, "key")
+    assert client.translate_many(["軍団", "兵士"]) == [None, None]
+
+
+def test_cancelled_text_is_left_out_of_batch(deepl_server):
+    client = DeepLClient(deepl_server.url, "key", batch_window=0.1)
+    cancelled = client.submit("軍団")
+    kept = client.submit("兵士")
+    assert cancelled.cancel()
+    assert kept.result(timeout=5) == "EN:兵士"
+    form, _ = deepl_server.requests[0]
+    assert form["text"] == ["兵士"]
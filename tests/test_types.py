@@ -0,0 +1,41 @@
+import pytest
+
+from zoritori.types import Box, Root, CharacterData, BlockData, RawData
+
+
+def _cdata(text, left, conf=90.0, context=None):
+    return CharacterData(text, 0, conf, Box(left, 10, 20, 30, context))
+
+
+def test_box_resolves_absolute_coordinates():
+    clip = Box(100, 200, 50, 50, Root(1000, 2000, 0, 0))
+    box = Box(5, 6, 7, 8, clip)
+    assert (box.screenx, box.screeny) == (1105, 2206)
+    assert (box.clientx, box.clienty) == (105, 206)
+    assert (box.left, box.top) == (5, 6)
+
+
+def test_character_data_delegates_to_box():
+    cdata = _cdata("戦", 40, context=Root(1, 2, 3, 4))
+    assert cdata.left == 40
+    assert cdata.screenx == 41
+    assert cdata.clienty == 14
+    assert cdata.context == Root(1, 2, 3, 4)
+    with pytest.raises(AttributeError):
+        cdata.missing
+
+
+def test_raw_data_packs_geometry():
+    line = [_cdata("戦", 0, 90.0), _cdata("闘", 20, 40.0)]
+    raw = RawData([line], [BlockData([line], Box(0, 10, 40, 30))])
+    geometry = raw.get_line_geometry()
+    assert len(geometry) == 2
+    assert geometry.column("left").tolist() == [0, 20]
+    assert geometry.client_rects().tolist() == [[0, 10, 20, 30], [20, 10, 20, 30]]
+    assert geometry.conf.tolist() == [90.0, 40.0]
+
+
+def test_raw_data_empty_geometry():
+    raw = RawData([], [])
+    assert len(raw.geometry) == 0
+    assert raw.geometry.client_rects().shape == (0, 4)
@@ -0,0 +1,111 @@
+import json
+
+import cv2
+import numpy as np
+
+import zoritori.video as video
+from zoritori.video import SceneSampler, Video
+from tests.test_pipeline import FakeRecognizer, _options
+
+
+def _checkerboard(shift=0, size=8, shape=(48, 96)):
+    ys, xs = np.indices(shape)
+    board = ((xs // size + ys // size + shift) % 2) * 255
+    return board.astype(np.uint8)
+
+
+BLANK = np.zeros((48, 96), np.uint8)
+A = _checkerboard(0)
+B = _checkerboard(1)
+
+
+def _feed(sampler, frames):
+    return [sampler.feed(frame) for frame in frames]
+
+
+def test_sampler_picks_settled_new_content():
+    sampler = SceneSampler(settle=2)
+    events = _feed(sampler, [BLANK] * 3 + [A] * 4 + [B] * 4)
+    assert events == [None] * 3 + [None, None, "start", None] + [
+        "end",
+        None,
+        "start",
+        None,
+    ]
+
+
+def test_sampler_waits_for_text_to_stop_changing():
+    sampler = SceneSampler(settle=2)
+    typing = [A.copy() for _ in range(3)]
+    for i, frame in enumerate(typing):
+        frame[:, (i + 1) * 24 :] = 0
+    events = _feed(sampler, typing + [A] * 3)
+    assert events.index("start") == len(typing) + 2
+    assert events.count("start") == 1
+
+
+def test_sampler_skips_repeats_and_blank_regions():
+    sampler = SceneSampler(settle=1)
+    events = _feed(sampler, [A] * 3 + [BLANK] * 3 + [A] * 3)
+    # the return to the same content isn't picked again:
+    assert events.count("start") == 1
+    assert events.count("end") == 1
+
+
+def test_srt():
+    srt = video.to_srt(
+        [{"start": 0.5, "end": 61.25, "text": "兵士", "translation": "soldier"}]
+    )
+    assert srt == "1\n00:00:00,500 --> 00:01:01,250\n兵士\nsoldier\n"
+
+
+class BoardRecognizer(FakeRecognizer):
+    """Reads the checkerboard's phase as one of two words"""
+
+    def recognize(self, filename, context, cancel=None, settings=None):
+        image = cv2.imread(filename, cv2.IMREAD_GRAYSCALE)
+        self.text = "兵士" if image[2, 2] < 128 else "走る"
+        return super().recognize(filename, context, cancel, settings)
+
+
+def test_video_writes_subtitles(tmp_path):
+    path = tmp_path / "play.avi"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 10, (96, 64))
+    # the text region is the bottom 48 rows, the top is "gameplay" that keeps moving:
+    for i, board in enumerate([BLANK] * 5 + [A] * 10 + [B] * 10 + [BLANK] * 5):
+        frame = np.zeros((64, 96), np.uint8)
+        frame[:16] = (i * 37) % 256
+        frame[16:] = board
+        writer.write(cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR))
+    writer.release()
+
+    summary = Video(
+        _options(False),
+        path,
+        region=(0, 16, 96, 48),
+        sample_fps=10,
+        workers=1,
+        recognizer=BoardRecognizer(),
+    ).run()
+
+    out = tmp_path / "play-zoritori"
+    subtitles = json.loads((out / "subtitles.json").read_text(encoding="utf-8"))
+    assert [(s["start"], s["end"], s["text"]) for s in subtitles] == [
+        (0.7, 1.5, "兵士"),
+        (1.7, 2.5, "走る"),
+    ]
+    assert (
+        (out / "subtitles.srt")
+        .read_text(encoding="utf-8")
+        .startswith("1\n00:00:00,700 --> 00:00:01,500\n兵士\n")
+    )
+    assert summary["processed"] == 2
+    assert summary["subtitles"] == 2
+    assert len(json.loads((out / "vocabulary.json").read_text(encoding="utf-8"))) == 2
+
+    # a second run reuses the picked frames and their results:
+    summary = Video(
+        _options(False), path, region=(0, 16, 96, 48), sample_fps=10, workers=1
+    ).run()
+    assert summary["skipped"] == 2
+    assert summary["processed"] == 0
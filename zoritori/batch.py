@@ -0,0 +1,257 @@
+import copy
+import json
+import logging
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict
+from pathlib import Path
+
+import zoritori.tokenizer as tokenizer
+import zoritori.translator as translator
+from zoritori.pipeline import process_image_light
+from zoritori.recognizers import create_recognizer
+from zoritori.vocabulary import vocabulary_words
+
+
+_logger = logging.getLogger("zoritori")
+
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".bmp", ".webp"}
+# texts sent to DeepL at once, and so how often results are written:
+TRANSLATE_BATCH = 50
+OUTPUT_FOLDER = "zoritori"
+
+# set in each worker process by _init_worker:
+_options = None
+_recognizer = None
+
+
+def _box(box):
+    return [box.screenx, box.screeny, box.width, box.height]
+
+
+def to_record(sdata):
+    """Plain JSON friendly copy of processed RichData"""
+    return {
+        "text": sdata.original,
+        "translation": sdata.translation,
+        "tokens": [
+            {
+                "surface": t.surface(),
+                "dictionary_form": t.dictionary_form(),
+                "reading": t.reading_form(),
+                "part_of_speech": list(t.part_of_speech()),
+                "box": _box(t.box()),
+            }
+            for t in sdata.tokens
+        ],
+        "blocks": [_box(b.box) for b in sdata.raw_data.blocks],
+        "vocabulary": list(dict.fromkeys(vocabulary_words(sdata.tokens))),
+        "quality": asdict(sdata.quality),
+    }
+
+
+def write_json(path, data):
+    """Writes then renames, so an interrupted run never leaves a partial file behind"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def find_images(root):
+    return sorted(
+        p for p in Path(root).rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES
+    )
+
+
+def record_path(image):
+    """Record file for an image, keeping its suffix so a.png and a.jpg don't share one"""
+    return image.with_name(image.name + ".json")
+
+
+def _is_done(image, output):
+    return output.exists() and output.stat().st_mtime >= image.stat().st_mtime
+
+
+def _recognize_options(options):
+    # translation is batched in the parent process, and notes aren't saved per image:
+    options = copy.copy(options)
+    options.Translate = False
+    options.NotesFolder = None
+    return options
+
+
+def _init_worker(options):
+    global _options, _recognizer
+    _options = options
+    _recognizer = create_recognizer(options)
+    tokenizer.configure(options.SplitMode, options.SudachiDict)
+
+
+def _process(path, options=None, recognizer=None):
+    """OCR and tokenize one image, returns its record (without translation)"""
+    sdata = process_image_light(
+        str(path), options or _options, recognizer or _recognizer
+    )
+    if sdata is None:
+        return {"text": None, "rejected": True}
+    return to_record(sdata)
+
+
+class Batch:
+    """
+    Processes a folder of images: OCR and tokenizing in worker processes, translation
+    batched in this one. Writes a JSON file per image (images that already have an up to
+    date one are skipped, so an interrupted run can be resumed), plus the vocabulary
+    across all of them and a summary
+    """
+
+    def __init__(self, options, root, output=None, workers=None, recognizer=None):
+        self._options = options
+        self._root = Path(root)
+        self._output = Path(output) if output else self._root / OUTPUT_FOLDER
+        self._workers = workers or os.cpu_count() or 1
+        # only used when running in this process, for a single worker:
+        self._recognizer = recognizer
+        self._pending = []
+        self._counts = Counter()
+
+    def _output_path(self, image):
+        return self._output / record_path(image.relative_to(self._root))
+
+    def _flush(self):
+        """Translates pending records, then writes them"""
+        if not self._pending:
+            return
+        to_translate = [r for _, r in self._pending if r["text"]]
+        if self._options.Translate and to_translate:
+            translations = translator.translate_many(
+                [r["text"] for r in to_translate],
+                self._options.DeepLUrl,
+                self._options.DeepLKey,
+            )
+            for record, translation in zip(to_translate, translations):
+                record["translation"] = translation
+        for image, record in self._pending:
+            write_json(self._output_path(image), record)
+        self._pending = []
+
+    def _done(self, image, record, total, started):
+        self._counts["processed"] += 1
+        if record.get("rejected"):
+            self._counts["rejected"] += 1
+        record["image"] = str(image.relative_to(self._root))
+        self._pending.append((image, record))
+        if len(self._pending) >= TRANSLATE_BATCH:
+            self._flush()
+
+        done = self._counts["processed"] + self._counts["failed"]
+        rate = done / max(time.perf_counter() - started, 1e-9)
+        eta = (total - done) / rate if rate else 0
+        _logger.info(
+            "[%d/%d] %s (%.1f images/s, %.0fs left)",
+            done,
+            total,
+            record["image"],
+            rate,
+            eta,
+        )
+
+    def _failed(self, image, e):
+        self._counts["failed"] += 1
+        _logger.error("Failed to process %s: %s", image, e)
+
+    def _run_serial(self, images, started):
+        options = _recognize_options(self._options)
+        recognizer = self._recognizer or create_recognizer(options)
+        for image in images:
+            try:
+                record = _process(image, options, recognizer)
+            except Exception as e:
+                self._failed(image, e)
+            else:
+                self._done(image, record, len(images), started)
+
+    def _run_pool(self, images, started):
+        with ProcessPoolExecutor(
+            max_workers=self._workers,
+            initializer=_init_worker,
+            initargs=(_recognize_options(self._options),),
+            # not forked, since the Sudachi warm up thread may be holding its lock:
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            futures = {executor.submit(_process, image): image for image in images}
+            for future in as_completed(futures):
+                image = futures[future]
+                try:
+                    record = future.result()
+                except Exception as e:
+                    self._failed(image, e)
+                else:
+                    self._done(image, record, len(images), started)
+
+    def _write_vocabulary(self, images):
+        """Counts how many images each word appears in, across this and earlier runs"""
+        counts = Counter()
+        for image in images:
+            path = self._output_path(image)
+            if path.exists():
+                record = json.loads(path.read_text(encoding="utf-8"))
+                counts.update(record.get("vocabulary", []))
+        write_json(self._output / "vocabulary.json", dict(counts.most_common()))
+        return len(counts)
+
+    def run(self):
+        """Processes every image that isn't done yet, returns the summary"""
+        images = find_images(self._root)
+        todo = [i for i in images if not _is_done(i, self._output_path(i))]
+        self._counts["skipped"] = len(images) - len(todo)
+        _logger.info(
+            "%d images in %s, %d already done",
+            len(images),
+            self._root,
+            len(images) - len(todo),
+        )
+
+        started = time.perf_counter()
+        try:
+            if self._workers > 1 and len(todo) > 1:
+                self._run_pool(todo, started)
+            elif todo:
+                self._run_serial(todo, started)
+        finally:
+            # keep what finished, even when interrupted:
+            self._flush()
+        seconds = time.perf_counter() - started
+
+        summary = {
+            "images": len(images),
+            "skipped": self._counts["skipped"],
+            "processed": self._counts["processed"],
+            "rejected": self._counts["rejected"],
+            "failed": self._counts["failed"],
+            "words": self._write_vocabulary(images),
+            "seconds": round(seconds, 3),
+            "images_per_second": round(self._counts["processed"] / seconds, 3)
+            if seconds
+            else 0.0,
+        }
+        write_json(self._output / "summary.json", summary)
+        _logger.info(
+            "processed %d images in %.1fs (%.2f images/s): %d rejected, %d failed, %d skipped, %d words",
+            summary["processed"],
+            seconds,
+            summary["images_per_second"],
+            summary["rejected"],
+            summary["failed"],
+            summary["skipped"],
+            summary["words"],
+        )
+        return summary
+
+
+def run(options, root, recognizer=None):
+    return Batch(options, root, options.OutputFolder, options.Workers, recognizer).run()
@@ -0,0 +1,170 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+MISSING = object()
+
+
+class LRUCache:
+    """Thread safe least recently used cache, which counts hits and misses"""
+
+    def __init__(self, maxsize=1024):
+        self._maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def get(self, key, default=MISSING):
+        """Returns the cached value, or default (MISSING unless given) if absent"""
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self._maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class DiskCache:
+    """
+    Persistent key/value cache in a SQLite file, values are stored as JSON.
+    Entries older than ttl seconds are ignored, and the least recently used
+    entries are dropped once there are more than max_entries
+    """
+
+    def __init__(self, path, ttl=None, max_entries=None):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)"
+        )
+        self._conn.commit()
+        self._puts = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def _is_expired(self, created, now):
+        return self._ttl is not None and now - created > self._ttl
+
+    def get(self, key, default=MISSING):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or self._is_expired(row[1], now):
+                self.misses += 1
+                return default
+            self._conn.execute(
+                "UPDATE cache SET accessed = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def get_many(self, keys):
+        """Returns a dict of the keys found, with one query per chunk of keys"""
+        keys = list(keys)
+        now = time.time()
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i : i + 500]
+                slots = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, value, created FROM cache WHERE key IN ({slots})",
+                    chunk,
+                ).fetchall()
+                for key, value, created in rows:
+                    if not self._is_expired(created, now):
+                        found[key] = json.loads(value)
+            if found:
+                self._conn.executemany(
+                    "UPDATE cache SET accessed = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now),
+            )
+            self._puts += 1
+            # trimming needs a count, so only do it every so often:
+            if self._max_entries and self._puts % 64 == 1:
+                self._trim()
+            self._conn.commit()
+
+    def _trim(self):
+        if self._ttl is not None:
+            self._conn.execute(
+                "DELETE FROM cache WHERE created < ?", (time.time() - self._ttl,)
+            )
+        count = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        excess = count - self._max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM cache ORDER BY accessed LIMIT ?)",
+                (excess,),
+            )
+
+    def trim(self):
+        with self._lock:
+            if self._max_entries:
+                self._trim()
+                self._conn.commit()
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,54 @@
+import threading
+
+
+class Cancelled(Exception):
+    """Raised when work is abandoned because its CancellationToken was cancelled"""
+
+
+class CancellationToken:
+    """
+    Shared flag for abandoning work that is no longer wanted, e.g. a frame superseded
+    by a newer screenshot. Long running work can register callbacks with on_cancel
+    (killing a process, cancelling a future) or poll with check()
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._callbacks = []
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def cancel(self):
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def on_cancel(self, callback):
+        """Calls callback when cancelled, or right away if already cancelled"""
+        with self._lock:
+            if not self._cancelled:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def check(self):
+        if self._cancelled:
+            raise Cancelled()
+
+    def result(self, future):
+        """Waits for future, raises Cancelled instead if cancelled first"""
+        done = threading.Event()
+        future.add_done_callback(lambda _: done.set())
+        self.on_cancel(done.set)
+        done.wait()
+        if self._cancelled:
+            future.cancel()
+            raise Cancelled()
+        return future.result()
@@ -4,20 +4,27 @@ import os
 import sys
 from pathlib import Path
 
+import zoritori.dictionary as dictionary
+import zoritori.metrics as metrics
+import zoritori.profiling as profiling
+import zoritori.tracing as tracing
 import zoritori.pipeline
-import zoritori.ui as ui
+import zoritori.tokenizer as tokenizer
+import zoritori.translator as translator
+from zoritori.recognizers import create_recognizer
 from zoritori.options import get_options
 from zoritori.files import start_new_session
+from zoritori.settings import get_cache_path
 
 
 def configure_logging(log_level):
     logger = logging.getLogger("zoritori")
-    logger.setLevel(logging.DEBUG)
+    # set the level on the logger itself (not just the handler) so that
+    # isEnabledFor(DEBUG) guards skip debug-only work at info level:
+    level = logging.DEBUG if log_level == "debug" else logging.INFO
+    logger.setLevel(level)
     ch = logging.StreamHandler()
-    if log_level == "debug":
-        ch.setLevel(logging.DEBUG)
-    else:
-        ch.setLevel(logging.INFO)
+    ch.setLevel(level)
     formatter = logging.Formatter("%(levelname)s - %(message)s")
     ch.setFormatter(formatter)
     logger.addHandler(ch)
@@ -28,6 +35,24 @@ def main():
 
     configure_logging(options.log_level)
 
+    tokenizer.configure(options.SplitMode, options.SudachiDict).warm_up()
+    dictionary.configure(
+        options.Dictionary,
+        options.DictionaryIndex,
+        options.DictionaryUrl,
+        get_cache_path("dictionary.sqlite"),
+    )
+    translator.configure_cache(
+        get_cache_path("translations.sqlite"), options.TranslationCacheSize
+    )
+
+    if options.TraceFile:
+        tracing.configure(True, options.TraceBufferSize)
+        tracing.export_at_exit(options.TraceFile)
+
+    if options.MetricsFile:
+        metrics.start_exporter(options.MetricsFile, options.MetricsInterval)
+
     if not options.NotesFolder and options.NotesRoot:
         prefix = options.NotesPrefix or "session"
         options.NotesFolder = start_new_session(options.NotesRoot, prefix)
@@ -40,12 +65,33 @@ def main():
         if not os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"):
             print("No Google Cloud environment variable found")
             exit(1)
-        from zoritori.recognizers.google_vision import Recognizer
 
-        recognizer = Recognizer()
-    elif options.Engine == "tesseract":
-        from zoritori.recognizers.tesseract import Recognizer
+    if options.command == "batch":
+        if not options.input:
+            print("batch needs a folder of images")
+            exit(1)
+        import zoritori.batch as batch
+
+        batch.run(options, options.input)
+        return
+    if options.command == "video":
+        if not options.input:
+            print("video needs a video file")
+            exit(1)
+        import zoritori.video as video
+
+        video.run(options, options.input)
+        return
+
+    recognizer = create_recognizer(options)
 
-        recognizer = Recognizer(options.TesseractExePath)
+    if options.profile:
+        profiling.start(options.NotesFolder or Path.cwd())
+    try:
+        # imported here since the overlay needs a display, which batch runs don't:
+        import zoritori.ui as ui
 
-    ui.main_loop(options, recognizer)
+        with profiling.thread_scope():
+            ui.main_loop(options, recognizer)
+    finally:
+        profiling.stop()
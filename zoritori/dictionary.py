@@ -1,14 +1,26 @@
+import json
 import logging
 import platform
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
 
-if platform.system() == "Windows":
-    from jisho_api.word import Word
-else:
-    from jamdict import Jamdict
+import zoritori.metrics as metrics
+from zoritori.cache import LRUCache, DiskCache, MISSING
+from zoritori.http_pool import ConnectionPool
+from zoritori.jmdict_index import JMdictIndex, format_gloss
 
 
 _logger = logging.getLogger("zoritori")
 
+CACHE_SIZE = 4096
+JISHO_URL = "https://jisho.org/api/v1/search/words"
+HTTP_CACHE_TTL = 30 * 24 * 60 * 60  # seconds
+HTTP_CACHE_ENTRIES = 100_000
+PREFETCH_BATCH = 32
+SQLITE_MAX_PARAMS = 500  # stay well under SQLite's limit on query parameters
+
 
 def _jamdict_entry_to_list(entry):
     result = []
@@ -21,9 +33,131 @@ def _jamdict_entry_to_list(entry):
     return result
 
 
-def lookup(s):
-    if platform.system() == "Windows":
-        r = Word.request(s)
+def _jisho_json_to_list(parsed):
+    data = parsed.get("data")
+    if not data:
+        return None
+    c = data[0]
+    j = c["japanese"][0]
+    result = [j.get("word"), j.get("reading")]
+    senses = c.get("senses")
+    if senses and len(senses[0]["english_definitions"]) > 0:
+        result.append(senses[0]["english_definitions"][0])
+    return [field for field in result if field]
+
+
+def _select_in(conn, sql, values):
+    """Runs sql, which has one `IN ({})`, over values in chunks"""
+    values = list(values)
+    for i in range(0, len(values), SQLITE_MAX_PARAMS):
+        chunk = values[i : i + SQLITE_MAX_PARAMS]
+        slots = ",".join("?" * len(chunk))
+        yield from conn.execute(sql.format(slots), chunk)
+
+
+def _is_wildcard(s):
+    # jamdict switches to LIKE queries for these:
+    return "_" in s or "@" in s or "%" in s
+
+
+class JamdictBackend:
+    """Local JMdict lookups through jamdict's SQLite database"""
+
+    def __init__(self):
+        from jamdict import Jamdict
+
+        self._jamdict_class = Jamdict
+        self._local = threading.local()
+
+    def _get_connection(self):
+        conn = getattr(self._local, "connection", None)
+        if conn is None:
+            db_file = self._get_jamdict().db_file
+            conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+            self._local.connection = conn
+        return conn
+
+    def _get_jamdict(self):
+        # jamdict keeps its SQLite connection open (reuse_ctx), but it can't be shared across threads:
+        jam = getattr(self._local, "jamdict", None)
+        if jam is None:
+            jam = self._jamdict_class(reuse_ctx=True)
+            self._local.jamdict = jam
+        return jam
+
+    def lookup(self, s):
+        # only dictionary entries are used, skip the kanji and named entity queries:
+        result = self._get_jamdict().lookup(s, lookup_chars=False, lookup_ne=False)
+        if result and len(result.entries) > 0:
+            entry = result.entries[0]
+            return _jamdict_entry_to_list(entry)
+        else:
+            return None
+
+    def lookup_many(self, words):
+        """
+        Looks up many words with a handful of IN (...) queries, instead of jamdict's
+        queries per word and entry. Returns the same lists as lookup
+        """
+        conn = self._get_connection()
+        results = {w: self.lookup(w) for w in words if _is_wildcard(w)}
+        words = [w for w in words if not _is_wildcard(w)]
+
+        # like jamdict, prefer entries matching a kanji form, then a kana form, then a gloss:
+        first_entry = {}
+        queries = [
+            "SELECT text, MIN(idseq) FROM Kanji WHERE text IN ({}) GROUP BY text",
+            "SELECT text, MIN(idseq) FROM Kana WHERE text IN ({}) GROUP BY text",
+            "SELECT g.text, MIN(s.idseq) FROM SenseGloss g JOIN Sense s ON s.ID = g.sid "
+            "WHERE g.text IN ({}) GROUP BY g.text",
+        ]
+        for sql in queries:
+            remaining = [w for w in words if w not in first_entry]
+            if len(remaining) == 0:
+                break
+            first_entry.update(_select_in(conn, sql, remaining))
+
+        idseqs = set(first_entry.values())
+        kanji = {}
+        kana = {}
+        for table, forms in (("Kanji", kanji), ("Kana", kana)):
+            sql = f"SELECT idseq, text FROM {table} WHERE idseq IN ({{}}) ORDER BY ID"
+            for idseq, text in _select_in(conn, sql, idseqs):
+                forms.setdefault(idseq, text)
+        first_senses = dict(
+            _select_in(
+                conn,
+                "SELECT MIN(ID), idseq FROM Sense WHERE idseq IN ({}) GROUP BY idseq",
+                idseqs,
+            )
+        )
+        glosses = {idseq: [] for idseq in first_senses.values()}
+        sql = "SELECT sid, lang, gend, text FROM SenseGloss WHERE sid IN ({}) ORDER BY rowid"
+        for sid, lang, gend, text in _select_in(conn, sql, first_senses):
+            glosses[first_senses[sid]].append(format_gloss(lang, gend, text))
+
+        for word in words:
+            idseq = first_entry.get(word)
+            if idseq is None:
+                results[word] = None
+                continue
+            result = [form for form in (kanji.get(idseq), kana.get(idseq)) if form]
+            if idseq in glosses:
+                result.append("/".join(glosses[idseq]))
+            results[word] = result
+        return results
+
+
+class JishoBackend:
+    """Online lookups through the jisho-api package"""
+
+    def __init__(self):
+        from jisho_api.word import Word
+
+        self._word_class = Word
+
+    def lookup(self, s):
+        r = self._word_class.request(s)
         if r and len(r.data) > 0:
             c = r.data[0]
             j = c.japanese[0]
@@ -32,11 +166,242 @@ def lookup(s):
             return [j.word, j.reading, ed]
         else:
             return None
+
+
+class HttpBackend:
+    """
+    Online lookups against a Jisho compatible search API, over pooled keep-alive
+    connections. Concurrent lookups of the same word share one request, and
+    results are kept in a persistent on-disk cache
+    """
+
+    def __init__(
+        self,
+        url=JISHO_URL,
+        cache_path=None,
+        ttl=HTTP_CACHE_TTL,
+        pool_size=4,
+        connect_timeout=3.0,
+        read_timeout=5.0,
+    ):
+        self._path = urlsplit(url).path
+        self._pool = ConnectionPool(url, pool_size, connect_timeout, read_timeout)
+        self._disk = (
+            DiskCache(cache_path, ttl=ttl, max_entries=HTTP_CACHE_ENTRIES)
+            if cache_path
+            else None
+        )
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def _request(self, s):
+        path = self._path + "?" + urlencode({"keyword": s})
+        headers = {"Accept": "application/json", "User-Agent": "zoritori"}
+        resp = self._pool.request("GET", path, headers=headers)
+        if resp.status != 200:
+            raise LookupError(f"HTTP {resp.status}, {resp.reason}")
+        return _jisho_json_to_list(json.loads(resp.body))
+
+    def lookup(self, s):
+        if self._disk is not None:
+            result = self._disk.get(s)
+            if result is not MISSING:
+                return result
+        with self._lock:
+            future = self._inflight.get(s)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[s] = future
+        if not owner:
+            return future.result()
+        try:
+            result = self._request(s)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            if self._disk is not None:
+                self._disk.put(s, result)
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._inflight[s]
+
+    def lookup_many(self, words):
+        """Looks up many words, resolving disk cache hits with one query and the rest in parallel"""
+        results = self._disk.get_many(words) if self._disk is not None else {}
+        misses = [w for w in words if w not in results]
+
+        def lookup(word):
+            try:
+                return word, self.lookup(word)
+            except Exception as e:
+                _logger.error("Dictionary lookup failed for %s: %s", word, e)
+                return word, MISSING
+
+        # bounded by the connection pool size:
+        with ThreadPoolExecutor(max_workers=self._pool.size) as executor:
+            for word, result in executor.map(lookup, misses):
+                if result is not MISSING:
+                    results[word] = result
+        return results
+
+    def close(self):
+        self._pool.close()
+        if self._disk is not None:
+            self._disk.close()
+
+
+def default_backend():
+    if platform.system() == "Windows":
+        return JishoBackend()
     else:
-        jam = Jamdict()
-        result = jam.lookup(s)
-        if result and len(result.entries) > 0:
-            entry = result.entries[0]
-            return _jamdict_entry_to_list(entry)
+        return JamdictBackend()
+
+
+class DictionaryService:
+    """Dictionary lookups through a backend, with an LRU cache of results"""
+
+    def __init__(self, backend=None, cache_size=CACHE_SIZE):
+        self._backend = backend
+        self._cache = LRUCache(cache_size)
+        self._prefetch_lock = threading.Condition()
+        self._prefetch_pending = None
+        self._prefetch_thread = None
+
+    @property
+    def cache(self):
+        return self._cache
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = default_backend()
+        return self._backend
+
+    def _fetch(self, s):
+        return self.backend.lookup(s)
+
+    def lookup(self, s):
+        """Looks up a word, returns [word, reading, definition] or None"""
+        result = self._cache.get(s)
+        if result is MISSING:
+            try:
+                with metrics.timer("dictionary_lookup"):
+                    result = self._fetch(s)
+            except Exception as e:
+                # not cached, so the word is tried again next time:
+                _logger.error("Dictionary lookup failed for %s: %s", s, e)
+                return None
+            self._cache.put(s, result)
         else:
-            return None
+            metrics.incr("lookups_cached")
+        return result
+
+    def lookup_many(self, words):
+        """Looks up many words at once, returns a dict of word to [word, reading, definition] or None"""
+        words = [w for w in dict.fromkeys(words) if w]
+        results = {}
+        misses = []
+        for word in words:
+            result = self._cache.get(word)
+            if result is MISSING:
+                misses.append(word)
+            else:
+                results[word] = result
+        metrics.incr("lookups_cached", len(results))
+        if len(misses) == 0:
+            return results
+        backend = self.backend
+        if hasattr(backend, "lookup_many"):
+            try:
+                with metrics.timer("dictionary_lookup_many"):
+                    found = backend.lookup_many(misses)
+            except Exception as e:
+                _logger.error(
+                    "Dictionary lookup failed for %d words: %s", len(misses), e
+                )
+                found = {}
+        else:
+            found = {}
+            for word in misses:
+                result = self.lookup(word)
+                if word in self._cache:
+                    found[word] = result
+        for word in misses:
+            if word in found:
+                self._cache.put(word, found[word])
+            # words that failed are not cached, so they're tried again next time:
+            results[word] = found.get(word)
+        return results
+
+    def prefetch(self, words):
+        """Looks up words in a background thread, replacing any prefetch still pending"""
+        words = [w for w in dict.fromkeys(words) if w and w not in self._cache]
+        with self._prefetch_lock:
+            self._prefetch_pending = words
+            if self._prefetch_thread is None:
+                self._prefetch_thread = threading.Thread(
+                    target=self._prefetch_loop, name="dictionary-prefetch", daemon=True
+                )
+                self._prefetch_thread.start()
+            self._prefetch_lock.notify()
+
+    def _prefetch_loop(self):
+        while True:
+            with self._prefetch_lock:
+                while self._prefetch_pending is None:
+                    self._prefetch_lock.wait()
+                words = self._prefetch_pending
+                self._prefetch_pending = None
+            for i in range(0, len(words), PREFETCH_BATCH):
+                if self._prefetch_pending is not None:
+                    break  # newer screen, start over with its words
+                self.lookup_many(words[i : i + PREFETCH_BATCH])
+
+
+_service = DictionaryService()
+
+
+def create_backend(name="auto", index_path=None, url=None, cache_path=None):
+    """Creates a dictionary backend by name: auto, jamdict, jisho, http or index"""
+    if name == "index" or (name == "auto" and index_path):
+        if not index_path:
+            raise ValueError("the index dictionary backend requires DictionaryIndex")
+        return JMdictIndex(index_path)
+    match name:
+        case "auto":
+            return default_backend()
+        case "jamdict":
+            return JamdictBackend()
+        case "jisho":
+            return JishoBackend()
+        case "http":
+            return HttpBackend(url or JISHO_URL, cache_path)
+        case _:
+            raise ValueError(f"unknown dictionary backend: {name}")
+
+
+def configure(backend="auto", index_path=None, url=None, cache_path=None):
+    """Replaces the shared dictionary service, e.g. after reading options"""
+    global _service
+    _service = DictionaryService(create_backend(backend, index_path, url, cache_path))
+    return _service
+
+
+def get_service():
+    return _service
+
+
+def lookup(s):
+    return _service.lookup(s)
+
+
+def lookup_many(words):
+    return _service.lookup_many(words)
+
+
+def prefetch(words):
+    _service.prefetch(words)
@@ -1,8 +1,11 @@
+import functools
 import logging
 
 import glfw
+import numpy as np
 import skia
 
+import zoritori.metrics as metrics
 from zoritori.strings import is_ascii
 from zoritori.platform import get_ja_font
 
@@ -13,12 +16,40 @@ FILL_RED = skia.Paint(Style=skia.Paint.kFill_Style, Color=skia.ColorRED)
 STROKE_BLUE = skia.Paint(Style=skia.Paint.kStroke_Style, Color=skia.ColorBLUE)
 STROKE_GREEN = skia.Paint(Style=skia.Paint.kStroke_Style, Color=skia.ColorGREEN)
 STROKE_RED = skia.Paint(Style=skia.Paint.kStroke_Style, Color=skia.ColorRED)
+PART_OF_SPEECH_BORDER_WIDTH = 3.0  # TODO: magic number
+STROKE_PERSON_NAME = skia.Paint(
+    Style=skia.Paint.kStroke_Style,
+    StrokeWidth=PART_OF_SPEECH_BORDER_WIDTH,
+    Color=skia.ColorSetARGB(0xFF, 0x35, 0xA1, 0x6B),
+)
+STROKE_PLACE_NAME = skia.Paint(
+    Style=skia.Paint.kStroke_Style,
+    StrokeWidth=PART_OF_SPEECH_BORDER_WIDTH,
+    Color=skia.ColorSetARGB(0xFF, 0xFF, 0x7F, 0x00),
+)
 
 
 _logger = logging.getLogger("zoritori")
 
 
+@functools.lru_cache(maxsize=32)
+def _get_font(family, size, bold=False):
+    """Typefaces and fonts are reused across frames instead of being rebuilt per string"""
+    if bold:
+        typeface = skia.Typeface(family, skia.FontStyle.Bold())
+    else:
+        typeface = skia.Typeface(family)
+    return skia.Font(typeface, size)
+
+
 def draw(c, render_state):
+    with metrics.timer("draw"):
+        _draw(c, render_state)
+        if render_state.options.debug:
+            draw_metrics_hud(c, metrics.snapshot(), render_state.options.SubtitleSize)
+
+
+def _draw(c, render_state):
     options = render_state.options
     sdata = render_state.primary_data
     clip = render_state.primary_clip.to_skia_rect()
@@ -32,13 +63,13 @@ def draw(c, render_state):
 
     if options.debug:
         draw_laser_point(c, 0, 0)
-        draw_character_boxes(c, sdata.cdata)
+        draw_character_boxes(c, sdata.raw_data.get_line_geometry())
         c.drawRect(clip, STROKE_BLUE)
         if secondary_clip:
             c.drawRect(secondary_clip, STROKE_BLUE)
 
     if sdata.cdata:
-        draw_low_confidence(c, sdata.cdata, 50)
+        draw_low_confidence(c, sdata.raw_data.get_line_geometry(), 50)
 
     if options.debug and sdata.raw_data.blocks:
         draw_block_boxes(c, sdata.raw_data.blocks)
@@ -87,6 +118,27 @@ def draw(c, render_state):
         )
 
 
+def draw_metrics_hud(c, snapshot, size, x=10, y=10):
+    """Draws per-stage latencies and counters in the top left corner"""
+    lines = [
+        f"{name}: p50 {h['p50_ms']:.0f}ms p95 {h['p95_ms']:.0f}ms n={h['count']}"
+        for name, h in sorted(snapshot["latency"].items())
+    ]
+    lines += [
+        f"{name}: {value}" for name, value in sorted(snapshot["counters"].items())
+    ]
+    if not lines:
+        return
+    font = _get_font("arial", size * 0.6)
+    height = font.getSpacing()
+    width = max(font.measureText(line) for line in lines)
+    c.drawRect(
+        skia.Rect.MakeXYWH(x, y, width + 10, height * len(lines) + 10), FILL_BLACK
+    )
+    for i, line in enumerate(lines):
+        c.drawString(line, x + 5, y + 5 + height * (i + 1), font, FILL_WHITE)
+
+
 def draw_subtitles(
     c, subtitle_size, subtitle_margin, text, x0=-1, y0=-1, direction=-1, debug=False
 ):
@@ -107,12 +159,10 @@ def draw_subtitles(
         lines.reverse()
     previous_height = 0
     for idx, line in enumerate(lines):
-        typeface = None
         if is_ascii(line):
-            typeface = skia.Typeface("arial")
+            font = _get_font("arial", subtitle_size)
         else:
-            typeface = skia.Typeface(get_ja_font())
-        font = skia.Font(typeface, subtitle_size)
+            font = _get_font(get_ja_font(), subtitle_size)
         w = font.measureText(line)
         height = font.getSpacing()
         x = x0 - (w + subtitle_margin) / 2
@@ -142,8 +192,7 @@ def draw_furigana(c, f, size):
     text = f.reading
     x = f.x
     y = f.y
-    typeface = skia.Typeface(get_ja_font(), skia.FontStyle.Bold())
-    font = skia.Font(typeface, size)
+    font = _get_font(get_ja_font(), size, bold=True)
     width = font.measureText(text)
     x = x - width / 2
     buffer = size / 4
@@ -172,25 +221,19 @@ def draw_all_furigana(c, render_state):
 
 
 def draw_parts_of_speech(c, sdata):
-    part_of_speech_border_width = 3.0  # TODO: magic number
-    paint = skia.Paint(
-        Style=skia.Paint.kStroke_Style, StrokeWidth=part_of_speech_border_width
-    )
     for t in sdata.tokens:
         if t.part_of_speech(2) == "人名":
-            paint.setColor(skia.ColorSetARGB(0xFF, 0x35, 0xA1, 0x6B))
+            paint = STROKE_PERSON_NAME
         elif t.part_of_speech(2) == "地名":
-            paint.setColor(skia.ColorSetARGB(0xFF, 0xFF, 0x7F, 0x00))
+            paint = STROKE_PLACE_NAME
         else:
             continue
         c.drawRect(t.box().to_skia_rect(), paint)
 
 
-def draw_character_boxes(c, lines):
-    for line in lines:
-        for cdata in line:
-            rect = cdata.to_skia_rect()
-            c.drawRect(rect, STROKE_GREEN)
+def draw_character_boxes(c, geometry):
+    for x, y, w, h in geometry.client_rects().tolist():
+        c.drawRect(skia.Rect.MakeXYWH(x, y, w, h), STROKE_GREEN)
 
 
 def draw_block_boxes(c, blocks):
@@ -199,16 +242,16 @@ def draw_block_boxes(c, blocks):
         c.drawRect(rect, STROKE_GREEN)
 
 
-def draw_low_confidence(c, lines, threshold=50):
-    boxes = []
-    for line in lines:
-        for cdata in line:
-            if cdata.conf < threshold:
-                boxes.append(cdata)
-    for box in boxes:
-        x = box.left + box.width / 2
-        y = box.top + box.height / 2
-        radius = box.width / 2
+def draw_low_confidence(c, geometry, threshold=50):
+    low = geometry.boxes[geometry.conf < threshold]
+    if len(low) == 0:
+        return
+    left = low[:, 0]
+    top = low[:, 1]
+    width = low[:, 2]
+    height = low[:, 3]
+    circles = np.column_stack((left + width / 2, top + height / 2, width / 2))
+    for x, y, radius in circles.tolist():
         c.drawCircle(x, y, radius, STROKE_RED)
 
 
@@ -0,0 +1,109 @@
+import copy
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from statistics import median
+
+import zoritori.metrics as metrics
+import zoritori.tracing as tracing
+
+
+_logger = logging.getLogger("zoritori")
+
+WINDOW = 5
+HEADROOM = 0.6
+DOWNSCALE = 0.75
+# assume a single uniform block of text, skipping tesseract's page layout analysis:
+BLOCK_PAGE_MODE = 6
+
+
+@dataclass
+class Level:
+    """One step down in quality: option values applied on top of the user's options"""
+
+    name: str
+    changes: dict
+
+
+def default_levels(options):
+    """Quality steps that apply to the configured engine, least noticeable first"""
+    levels = []
+    if options.Translate:
+        levels.append(Level("deferred translation", {"DeferTranslation": True}))
+    if options.Engine == "tesseract":
+        levels.append(Level("block-only OCR", {"TesseractPageMode": BLOCK_PAGE_MODE}))
+        if options.OcrScale > DOWNSCALE:
+            levels.append(Level("downscaled OCR", {"OcrScale": DOWNSCALE}))
+        if options.TesseractFastLang:
+            levels.append(
+                Level("fast OCR model", {"TesseractLang": options.TesseractFastLang})
+            )
+    return levels
+
+
+class LatencyGovernor:
+    """
+    Keeps end-to-end frame latency within budget_ms by stepping down through levels
+    when the median of the last window frames is over budget, and back up when it's
+    under headroom * budget_ms
+    """
+
+    def __init__(self, budget_ms, levels, window=WINDOW, headroom=HEADROOM):
+        self.budget_ms = budget_ms
+        self.levels = levels
+        self._window = window
+        self._headroom = headroom
+        self._samples = deque(maxlen=window)
+        self._level = 0
+        self._lock = threading.Lock()
+
+    @property
+    def level(self):
+        return self._level
+
+    def apply(self, options):
+        """Returns a copy of options with the current level's changes applied"""
+        with self._lock:
+            levels = self.levels[: self._level]
+        if not levels:
+            return options
+        options = copy.copy(options)
+        for level in levels:
+            for name, value in level.changes.items():
+                setattr(options, name, value)
+        return options
+
+    def observe(self, latency_ms):
+        """Records a frame's end-to-end latency, adapting the level when needed"""
+        with self._lock:
+            self._samples.append(latency_ms)
+            if len(self._samples) < self._window:
+                return
+            recent = median(self._samples)
+            if recent > self.budget_ms and self._level < len(self.levels):
+                level = self.levels[self._level]
+                self._level += 1
+                direction = "down"
+                _logger.info(
+                    "latency %.0fms over %dms budget, stepping down to %s",
+                    recent,
+                    self.budget_ms,
+                    level.name,
+                )
+            elif recent < self.budget_ms * self._headroom and self._level > 0:
+                self._level -= 1
+                level = self.levels[self._level]
+                direction = "up"
+                _logger.info(
+                    "latency %.0fms within %dms budget, stepping up from %s",
+                    recent,
+                    self.budget_ms,
+                    level.name,
+                )
+            else:
+                return
+            # judge the new level on its own frames:
+            self._samples.clear()
+        metrics.incr(f"governor_step_{direction}")
+        tracing.instant("governor", direction=direction, level=level.name)
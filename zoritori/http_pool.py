@@ -0,0 +1,97 @@
+import http.client
+import logging
+import queue
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+
+_logger = logging.getLogger("zoritori")
+
+
+@dataclass
+class Response:
+    status: int
+    reason: str
+    headers: dict
+    body: bytes
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections to a single host, with connect and read timeouts"""
+
+    def __init__(self, url, size=4, connect_timeout=3.0, read_timeout=10.0):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"unsupported URL scheme: {url}")
+        self._scheme = parts.scheme
+        self._host = parts.hostname
+        self._port = parts.port
+        self._connect_timeout = connect_timeout
+        self._read_timeout = read_timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        self.size = size
+
+    def _connect(self):
+        if self._scheme == "https":
+            conn = http.client.HTTPSConnection(
+                self._host, self._port, timeout=self._connect_timeout
+            )
+        else:
+            conn = http.client.HTTPConnection(
+                self._host, self._port, timeout=self._connect_timeout
+            )
+        conn.connect()
+        conn.sock.settimeout(self._read_timeout)
+        return conn
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            return self._connect(), False
+
+    def _checkin(self, conn):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def request(self, method, path, body=None, headers=None):
+        """
+        Sends a request and reads the whole response. A reused connection that turns
+        out to be closed by the server is replaced and the request is sent again
+        """
+        headers = headers or {}
+        while True:
+            conn, reused = self._checkout()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+            except (
+                http.client.RemoteDisconnected,
+                ConnectionResetError,
+                BrokenPipeError,
+            ):
+                conn.close()
+                if reused:
+                    _logger.debug(
+                        "stale keep-alive connection to %s, retrying", self._host
+                    )
+                    continue
+                raise
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                raise
+            if resp.will_close:
+                conn.close()
+            else:
+                self._checkin(conn)
+            return Response(resp.status, resp.reason, dict(resp.getheaders()), data)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
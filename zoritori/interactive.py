@@ -0,0 +1,205 @@
+import argparse
+import logging
+import queue
+import threading
+import webbrowser
+from dataclasses import dataclass, replace
+
+import glfw
+
+from zoritori.drawing import draw
+from zoritori.types import RichData, Box, Token
+import zoritori.dictionary as dictionary
+import zoritori.profiling as profiling
+import zoritori.tracing as tracing
+
+
+@dataclass
+class RenderState:
+    """Snapshot of app state that gets drawn to the screen"""
+
+    options: argparse.Namespace
+    primary_data: RichData
+    primary_clip: Box
+    secondary_data: list[str]
+    secondary_clip: Box
+    hover: Token
+    hover_lookup: list[str]
+
+
+class View:
+    """
+    What's on screen, plus the latest finished results that hovering and searches use.
+    The watcher publishes into it from the background and the interactive loop updates
+    the hover, so either side can redraw without waiting on the other
+    """
+
+    def __init__(self, options, overlay):
+        self._overlay = overlay
+        self._lock = threading.Lock()
+        self._state = RenderState(options, None, None, None, None, None, None)
+        self._latest = None
+        self._latest_clip = None
+
+    def snapshot(self):
+        with self._lock:
+            return replace(self._state)
+
+    @property
+    def latest(self):
+        """The newest finished results, kept while fresh ones are processed"""
+        return self._latest
+
+    def _update(self, **changes):
+        with self._lock:
+            self._state = replace(self._state, **changes)
+            state = self._state
+        self._draw(state)
+
+    def _draw(self, state):
+        if state.primary_data is not None:
+            self._overlay.draw(lambda c: draw(c, state))
+
+    def redraw(self):
+        self._draw(self.snapshot())
+
+    def reset(self):
+        """Clears the screen ahead of fresh results"""
+        with self._lock:
+            self._state = RenderState(
+                self._state.options, None, None, None, None, None, None
+            )
+        self._overlay.clear(block=True)
+
+    def publish(self, clip, sdata):
+        """Shows finished results, which become the target for hovering"""
+        with self._lock:
+            self._latest = sdata
+            self._latest_clip = clip
+        self._update(
+            primary_clip=clip, primary_data=sdata, hover=None, hover_lookup=None
+        )
+
+    def publish_partial(self, clip, sdata):
+        """Draws results still being processed, without keeping them"""
+        self._draw(replace(self.snapshot(), primary_clip=clip, primary_data=sdata))
+
+    def publish_secondary(self, clip, lookup):
+        self._update(
+            secondary_clip=clip,
+            secondary_data=lookup,
+            primary_clip=self._latest_clip,
+            primary_data=self._latest,
+        )
+
+    def set_hover(self, hover, lookup):
+        self._update(hover=hover, hover_lookup=lookup)
+
+
+class InteractiveLoop(threading.Thread):
+    """
+    Low latency loop for input: polls the cursor for hover lookups and handles key and
+    clip events against the latest published results, while the watcher does OCR
+    """
+
+    def __init__(self, options, event_queue, overlay, view, watcher):
+        threading.Thread.__init__(self, name="interactive")
+        self._stop_flag = threading.Event()
+        self._HOVER_INTERVAL = 0.05  # seconds between cursor polls
+        self._logger = logging.getLogger("zoritori")
+
+        self._options = options
+        self._event_queue = event_queue
+        self._overlay = overlay
+        self._view = view
+        self._watcher = watcher
+        self._last_hover = None
+
+    def stop(self):
+        self._stop_flag.set()
+
+    def _handle_event(self, event):
+        """Handles input events from the overlay"""
+        if not event:
+            return
+        clip = event.get_clip()
+        key = event.get_key()
+        if clip and (key == glfw.KEY_R or key == glfw.MOUSE_BUTTON_1):
+            self._logger.debug("got primary clip event: %s", clip)
+            self._watcher.set_primary_clip(clip)
+        elif clip and (key == glfw.KEY_Q or key == glfw.MOUSE_BUTTON_2):
+            self._logger.debug("got secondary clip event: %s", clip)
+            self._watcher.set_secondary_clip(clip)
+        elif key:
+            self._logger.debug("got key event: %s", key)
+            self._handle_key(key)
+        else:
+            self._logger.debug("got unknown event: %s", event)
+
+    def _open_search(self, url):
+        search_term = None
+        if self._last_hover:
+            search_term = self._last_hover.surface()
+        elif self._view.latest:
+            search_term = self._view.latest.original
+        if search_term:
+            webbrowser.open(url + search_term)
+
+    def _handle_key(self, key):
+        match key:
+            case glfw.KEY_C:
+                self._overlay.clear()
+                self._watcher.refresh()
+            case glfw.KEY_D:
+                self._options.debug = not self._options.debug
+                self._view.redraw()
+            case glfw.KEY_T:
+                self._options.Translate = not self._options.Translate
+                self._watcher.refresh()
+            case glfw.KEY_J:
+                self._open_search("http://jisho.org/search/")
+            case glfw.KEY_W:
+                self._open_search("https://ja.wikipedia.org/wiki/")
+            case glfw.KEY_E:
+                self._open_search("https://en.wikipedia.org/w/index.php?search=")
+            case glfw.KEY_P:
+                if self._options.TraceFile:
+                    tracing.export(self._options.TraceFile)
+            case glfw.KEY_MINUS:
+                self._options.FuriganaSize = self._options.FuriganaSize - 1
+                self._view.redraw()
+            case glfw.KEY_EQUAL:
+                self._options.FuriganaSize = self._options.FuriganaSize + 1
+                self._view.redraw()
+
+    def _find_hover(self, sdata: RichData):
+        pos = self._overlay.get_mouse_pos()
+        if not pos:
+            return None
+        (x, y) = pos
+        return sdata.token_index.find(x, y)
+
+    def _update_hover(self):
+        """Check if the mouse cursor is hovering over a token, and if so look it up and redraw"""
+        sdata = self._view.latest
+        if not sdata:
+            return
+        hover = self._find_hover(sdata)
+        if hover != self._last_hover:
+            self._last_hover = hover
+            entry = dictionary.lookup(hover.surface()) if hover else None
+            self._logger.debug("hovered token: %s", entry)
+            self._view.set_hover(hover, entry)
+
+    def run(self):
+        with profiling.thread_scope():
+            while not self._stop_flag.is_set():
+                try:
+                    event = self._event_queue.get(timeout=self._HOVER_INTERVAL)
+                except queue.Empty:
+                    event = None
+                try:
+                    self._handle_event(event)
+                    self._update_hover()
+                except Exception:
+                    self._logger.exception("Exception while handling input")
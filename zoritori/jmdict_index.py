@@ -0,0 +1,227 @@
+"""
+Compact, read-only JMdict index for offline lookups.
+
+The index is built once from the jamdict SQLite database, and holds only what
+`dictionary.lookup` returns: for every kanji and kana form, the headword, reading
+and first gloss of the first entry with that form. Lookups bisect a sorted key
+table in a memory-mapped file, so they don't touch SQLite at all.
+
+Build it with: python -m zoritori.jmdict_index /path/to/jmdict.idx
+"""
+
+import argparse
+import logging
+import mmap
+import sqlite3
+import struct
+import time
+from pathlib import Path
+
+import numpy as np
+
+_logger = logging.getLogger("zoritori")
+
+MAGIC = b"ZJMDIX01"
+# magic, key count, entry count, key blob size, entry blob size:
+HEADER = struct.Struct("<8sIIII")
+FIELD_SEPARATOR = "\x1f"
+
+
+def format_gloss(lang, gend, text):
+    # same formatting as jamdict's SenseGloss.__str__:
+    tmp = [text]
+    if lang and lang != "eng":
+        tmp.append("(lang:%s)" % lang)
+    if gend:
+        tmp.append("(gend:%s)" % gend)
+    return " ".join(tmp)
+
+
+def _read_jmdict(db_file):
+    """Reads keys and first forms/glosses for each entry, returns (keys, records)"""
+    conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+    try:
+        # jamdict returns entries in table order, so the first entry for a key is the one with the lowest rowid:
+        order = {
+            idseq: rank
+            for rank, (idseq,) in enumerate(
+                conn.execute("SELECT idseq FROM Entry ORDER BY rowid")
+            )
+        }
+        kanji = {}
+        kana = {}
+        keys = {}
+        for table, first_forms in (("Kanji", kanji), ("Kana", kana)):
+            for idseq, text in conn.execute(
+                f"SELECT idseq, text FROM {table} ORDER BY ID"
+            ):
+                if idseq not in order or not text:
+                    continue
+                first_forms.setdefault(idseq, text)
+                if text not in keys or order[idseq] < order[keys[text]]:
+                    keys[text] = idseq
+        first_senses = {
+            sid: idseq
+            for idseq, sid in conn.execute(
+                "SELECT idseq, MIN(ID) FROM Sense GROUP BY idseq"
+            )
+        }
+        glosses = {}
+        for sid, lang, gend, text in conn.execute(
+            "SELECT sid, lang, gend, text FROM SenseGloss ORDER BY rowid"
+        ):
+            if sid in first_senses:
+                glosses.setdefault(first_senses[sid], []).append(
+                    format_gloss(lang, gend, text)
+                )
+    finally:
+        conn.close()
+
+    has_senses = set(first_senses.values())
+    records = {}
+    for idseq in set(keys.values()):
+        if idseq in has_senses:
+            gloss = "/".join(glosses.get(idseq, []))
+        else:
+            gloss = None
+        records[idseq] = (kanji.get(idseq, ""), kana.get(idseq, ""), gloss)
+    return keys, records
+
+
+def _encode_record(record):
+    # an absent sense is marked by a missing separator, an empty gloss list is still a field:
+    headword, reading, gloss = record
+    fields = [headword, reading] if gloss is None else [headword, reading, gloss]
+    return FIELD_SEPARATOR.join(fields).encode("utf-8")
+
+
+def build_index(output_path, db_file=None):
+    """Compiles the jamdict database (by default, the one from jamdict-data) into an index file"""
+    if db_file is None:
+        from jamdict import Jamdict
+
+        db_file = Jamdict().db_file
+    start = time.perf_counter()
+    keys, records = _read_jmdict(db_file)
+
+    entry_ids = sorted(records)
+    entry_numbers = {idseq: i for i, idseq in enumerate(entry_ids)}
+    entry_blobs = [_encode_record(records[idseq]) for idseq in entry_ids]
+
+    encoded_keys = sorted(
+        (key.encode("utf-8"), entry_numbers[idseq]) for key, idseq in keys.items()
+    )
+    key_blobs = [key for key, _ in encoded_keys]
+
+    def offsets(blobs):
+        return np.concatenate(([0], np.cumsum([len(b) for b in blobs]))).astype("<u4")
+
+    key_blob = b"".join(key_blobs)
+    entry_blob = b"".join(entry_blobs)
+    with open(output_path, "wb") as f:
+        f.write(
+            HEADER.pack(
+                MAGIC, len(key_blobs), len(entry_blobs), len(key_blob), len(entry_blob)
+            )
+        )
+        f.write(offsets(key_blobs).tobytes())
+        f.write(np.array([n for _, n in encoded_keys], dtype="<u4").tobytes())
+        f.write(offsets(entry_blobs).tobytes())
+        f.write(key_blob)
+        f.write(entry_blob)
+    _logger.info(
+        "built JMdict index with %d keys and %d entries in %.1fs: %s",
+        len(key_blobs),
+        len(entry_blobs),
+        time.perf_counter() - start,
+        output_path,
+    )
+    return Path(output_path)
+
+
+class JMdictIndex:
+    """Memory-mapped index built by build_index, with the same lookup results as dictionary.lookup"""
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n_keys, n_entries, key_blob_size, entry_blob_size = HEADER.unpack_from(
+            self._mm, 0
+        )
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"not a JMdict index: {path}")
+        offset = HEADER.size
+
+        def table(count):
+            nonlocal offset
+            array = np.frombuffer(self._mm, dtype="<u4", count=count, offset=offset)
+            offset += 4 * count
+            return array
+
+        self._key_offsets = table(n_keys + 1)
+        self._key_entries = table(n_keys)
+        self._entry_offsets = table(n_entries + 1)
+        self._key_base = offset
+        self._entry_base = offset + key_blob_size
+        self._n_keys = n_keys
+
+    def __len__(self):
+        return self._n_keys
+
+    def _key(self, i):
+        start = self._key_base + int(self._key_offsets[i])
+        end = self._key_base + int(self._key_offsets[i + 1])
+        return self._mm[start:end]
+
+    def _find(self, key: bytes):
+        lo = 0
+        hi = self._n_keys
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._n_keys and self._key(lo) == key:
+            return int(self._key_entries[lo])
+        return None
+
+    def lookup(self, s):
+        """Looks up a word, returns [word, reading, definition] or None"""
+        entry = self._find(s.encode("utf-8"))
+        if entry is None:
+            return None
+        start = self._entry_base + int(self._entry_offsets[entry])
+        end = self._entry_base + int(self._entry_offsets[entry + 1])
+        fields = self._mm[start:end].decode("utf-8").split(FIELD_SEPARATOR)
+        # match _jamdict_entry_to_list, which skips missing forms:
+        result = [f for f in fields[:2] if f]
+        result.extend(fields[2:])
+        return result
+
+    def lookup_many(self, words):
+        return {w: self.lookup(w) for w in words}
+
+    def close(self):
+        # views from np.frombuffer keep the mmap exported, release them first:
+        self._key_offsets = self._key_entries = self._entry_offsets = None
+        self._mm.close()
+        self._file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build a compact JMdict index for offline lookups"
+    )
+    parser.add_argument("output", help="Path to write the index to")
+    parser.add_argument(
+        "--db", help="Path to a jamdict database, defaults to jamdict-data"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    build_index(args.output, args.db)
+
+
+if __name__ == "__main__":
+    main()
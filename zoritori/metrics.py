@@ -0,0 +1,173 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import zoritori.tracing as tracing
+
+
+_logger = logging.getLogger("zoritori")
+
+# upper bounds of the latency buckets, in milliseconds:
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+EXPORT_INTERVAL = 5.0
+
+
+class Histogram:
+    """Latency histogram with fixed buckets, so observing is cheap and memory is constant"""
+
+    def __init__(self, bounds=BUCKETS_MS):
+        self.bounds = bounds
+        # the last bucket catches everything above the largest bound:
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(self.bounds, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def quantile(self, q):
+        """Estimates the q quantile as the upper bound of the bucket it falls in"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(float(bound), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.mean(), 3),
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "max_ms": round(self.max, 3),
+            "buckets": dict(zip([*map(str, self.bounds), "+Inf"], self.counts)),
+        }
+
+
+class Registry:
+    """Named latency histograms and counters, shared by the app's threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    def observe(self, name, ms):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(ms)
+
+    def incr(self, name, n=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    @contextmanager
+    def timer(self, name):
+        """Times the block into the named histogram, and as a trace span when tracing"""
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            self.observe(name, (end - start) / 1e6)
+            tracing.complete(name, start // 1000, end // 1000)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "latency": {k: h.snapshot() for k, h in self._histograms.items()},
+                "counters": dict(self._counters),
+            }
+
+    def to_prometheus(self):
+        """Formats metrics in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"# TYPE zoritori_{name}_total counter")
+            lines.append(f"zoritori_{name}_total {value}")
+        for name, h in sorted(snapshot["latency"].items()):
+            metric = f"zoritori_{name}_ms"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in h["buckets"].items():
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f"{metric}_sum {h['mean_ms'] * h['count']:.3f}")
+            lines.append(f"{metric}_count {h['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Writes metrics to path, as Prometheus text for .prom files and JSON otherwise"""
+        path = Path(path)
+        if path.suffix == ".prom":
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.snapshot(), indent=2)
+        # write then rename, so readers never see a half written file:
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(content, encoding="utf-8")
+        os.replace(tmp, path)
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+_registry = Registry()
+
+
+def get_registry():
+    return _registry
+
+
+def observe(name, ms):
+    _registry.observe(name, ms)
+
+
+def incr(name, n=1):
+    _registry.incr(name, n)
+
+
+def timer(name):
+    """Context manager that records how long its block took in the named histogram"""
+    return _registry.timer(name)
+
+
+def snapshot():
+    return _registry.snapshot()
+
+
+def start_exporter(path, interval=EXPORT_INTERVAL):
+    """Rewrites the metrics file every interval seconds on a daemon thread"""
+
+    def export():
+        while True:
+            time.sleep(interval)
+            try:
+                _registry.write(path)
+            except OSError as e:
+                _logger.error("Failed to write metrics to %s: %s", path, e)
+
+    thread = threading.Thread(target=export, name="metrics", daemon=True)
+    thread.start()
+    return thread
@@ -1,6 +1,11 @@
 import configargparse
 
 
+def _optional_int(s):
+    """int, or None for an empty value (e.g. `Option =` in config.ini)"""
+    return int(s) if s.strip() else None
+
+
 def get_options():
     parser = configargparse.ArgParser(
         default_config_files=["config.ini"],
@@ -9,12 +14,34 @@ def get_options():
     parser.add("-d", "--debug", action="store_true")
     parser.add("--files-debug", action="store_true")
     parser.add("-n", "--no-watch", action="store_true")
+    parser.add(
+        "--profile",
+        action="store_true",
+        help=(
+            "Profile the session with cProfile and tracemalloc, "
+            "writing reports to the notes folder (or the current folder) on exit"
+        ),
+    )
     parser.add(
         "-l", "--log-level", default="info", choices=["info", "debug"], action="store"
     )
     parser.add(
         "-c", "--config", required=True, is_config_file=True, help="Path to config file"
     )
+    parser.add(
+        "command",
+        nargs="?",
+        default="ui",
+        choices=["ui", "batch", "video"],
+        help=(
+            "`ui` (the default) runs the overlay, "
+            "`batch` processes a folder of images without one, "
+            "and `video` reads subtitles out of a video file"
+        ),
+    )
+    parser.add(
+        "input", nargs="?", help=("Folder of images for `batch`, or file for `video`")
+    )
     parser.add(
         "-f",
         "--Furigana",
@@ -46,10 +73,191 @@ def get_options():
     parser.add(
         "--TesseractExePath", action="store", help=("Path to Tesseract executable")
     )
+    parser.add(
+        "--TesseractLang",
+        default="jpn",
+        action="store",
+        help=("Tesseract language model, e.g. jpn or jpn_vert"),
+    )
+    parser.add(
+        "--TesseractFastLang",
+        action="store",
+        help=(
+            "Optional faster Tesseract model (e.g. from tessdata_fast, installed as "
+            "jpn_fast), used when behind the latency budget"
+        ),
+    )
+    parser.add(
+        "--TesseractPageMode",
+        type=_optional_int,
+        action="store",
+        help=("Tesseract page segmentation mode (--psm), default is automatic"),
+    )
+    parser.add(
+        "--OcrScale",
+        default=1.0,
+        type=float,
+        action="store",
+        help=("Scale screenshots by this factor before OCR, below 1 is faster"),
+    )
+    parser.add(
+        "--LatencyBudgetMs",
+        default=0,
+        type=int,
+        action="store",
+        help=(
+            "Target milliseconds from screenshot to result. When over budget, "
+            "translation is deferred and OCR gets faster and less accurate. 0 disables"
+        ),
+    )
+    parser.add(
+        "--DeferTranslation",
+        action="store_true",
+        help=("Show results without waiting for the translation, which follows later"),
+    )
+    parser.add(
+        "--SplitMode",
+        default="A",
+        choices=["A", "B", "C"],
+        action="store",
+        help=("Sudachi split mode, from shortest (A) to longest (C) units"),
+    )
+    parser.add(
+        "--SudachiDict",
+        default="core",
+        choices=["small", "core", "full"],
+        action="store",
+        help=(
+            "Sudachi dictionary edition. `small` and `full` require installing "
+            "SudachiDict-small or SudachiDict-full"
+        ),
+    )
+    parser.add(
+        "--Dictionary",
+        default="auto",
+        choices=["auto", "jamdict", "jisho", "http", "index"],
+        action="store",
+        help=(
+            "Dictionary backend for lookups. `auto` uses DictionaryIndex if set, "
+            "otherwise jisho on Windows and jamdict elsewhere. `http` queries "
+            "DictionaryUrl over pooled connections and caches results on disk"
+        ),
+    )
+    parser.add(
+        "--DictionaryUrl",
+        action="store",
+        help=("Jisho compatible word search URL for the `http` dictionary backend"),
+    )
+    parser.add(
+        "--DictionaryIndex",
+        action="store",
+        help=(
+            "Path to a compiled JMdict index (see `python -m zoritori.jmdict_index`). "
+            "If present, dictionary lookups use it instead of jamdict or jisho"
+        ),
+    )
     parser.add("-t", "--Translate", action="store_true")
     parser.add("--ProperNouns", action="store_true", default=True)
     parser.add("--DeepLUrl", action="store", help=("DeepL API translate URL"))
     parser.add("--DeepLKey", action="store", help=("DeepL API key"))
+    parser.add(
+        "--TranslationCacheSize",
+        default=50000,
+        type=int,
+        action="store",
+        help=(
+            "Number of translations to keep in ~/.zoritori, so repeated text "
+            "isn't sent to DeepL again. 0 disables the cache"
+        ),
+    )
+    parser.add(
+        "--MinConfidence",
+        default=50.0,
+        type=float,
+        action="store",
+        help=("Skip OCR results below this median confidence (0-100), 0 disables"),
+    )
+    parser.add(
+        "--MaxAsciiRatio",
+        default=0.25,
+        type=float,
+        action="store",
+        help=("Skip OCR results with a larger share of ASCII characters, 1 disables"),
+    )
+    parser.add(
+        "--MinJapaneseRatio",
+        default=0.5,
+        type=float,
+        action="store",
+        help=("Skip OCR results with a smaller share of kana/kanji, 0 disables"),
+    )
+    parser.add(
+        "--MinCharacters",
+        default=1,
+        type=int,
+        action="store",
+        help=("Skip OCR results with fewer characters than this"),
+    )
+    parser.add(
+        "--MetricsFile",
+        action="store",
+        help=(
+            "Path to periodically write per-stage latencies and counters to, "
+            "as Prometheus text if it ends in .prom, JSON otherwise"
+        ),
+    )
+    parser.add(
+        "--MetricsInterval",
+        default=5.0,
+        type=float,
+        action="store",
+        help=("Seconds between metrics file updates"),
+    )
+    parser.add(
+        "--TraceFile",
+        action="store",
+        help=(
+            "Path to write a Chrome trace (chrome://tracing, Perfetto) of pipeline "
+            "steps to on exit, or when P is pressed. Tracing is off if not set"
+        ),
+    )
+    parser.add(
+        "--TraceBufferSize",
+        default=100000,
+        type=int,
+        action="store",
+        help=("Number of most recent trace events to keep"),
+    )
+    parser.add(
+        "--OutputFolder",
+        action="store",
+        help=(
+            "Where `batch` and `video` write their results, "
+            "defaults to a zoritori folder inside (or next to) the input"
+        ),
+    )
+    parser.add(
+        "--Workers",
+        default=0,
+        type=int,
+        action="store",
+        help=("Number of processes for `batch` and `video`, 0 uses one per CPU"),
+    )
+    parser.add(
+        "--SampleFps",
+        default=4.0,
+        type=float,
+        action="store",
+        help=("Frames per second `video` checks for new text"),
+    )
+    parser.add(
+        "--VideoRegion",
+        action="store",
+        help=(
+            "Region of the video with text as x,y,w,h in pixels, "
+            "defaults to the region last selected in the overlay"
+        ),
+    )
     parser.add(
         "--NotesFolder",
         action="store",
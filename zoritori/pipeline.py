@@ -1,36 +1,29 @@
 import logging
 import sys
 import os
+import threading
+import time
 from pathlib import Path
 from operator import itemgetter
-from statistics import median
-from dataclasses import dataclass
+from concurrent.futures import Future
+from dataclasses import dataclass, field, replace
 
-from zoritori.translator import translate
+import zoritori.dictionary as dictionary
+import zoritori.metrics as metrics
+from zoritori.cancellation import CancellationToken
+from zoritori.quality import QualityGate
+from zoritori.stages import Filtered, Stage, StagedPipeline
+from zoritori.strings import is_punctuation
+from zoritori.translator import translate_async
 from zoritori.tokenizer import tokenize
-from zoritori.types import Furigana, RichData, Box
+from zoritori.types import Furigana, RichData, Box, OcrSettings
 from zoritori.vocabulary import save_vocabulary
 
 
 _logger = logging.getLogger("zoritori")
 
-
-def _percent_ascii(ldata):
-    a = 0
-    t = 0
-    for line in ldata:
-        for d in line:
-            t += 1
-            if ord(d.text) < 128:
-                a += 1
-    return a / t * 100
-
-
-def _is_junk(ldata):
-    if len(ldata) == 0:
-        return True
-    conf = median([d.conf for line in ldata for d in line])
-    return conf < 75 or _percent_ascii(ldata) > 25
+# treat the image as a single line of text, the usual shape of a quick lookup clip:
+SINGLE_LINE_PAGE_MODE = 7
 
 
 def _get_text(ldata):
@@ -38,56 +31,291 @@ def _get_text(ldata):
     return "\n".join(lines)
 
 
-def _recognize_tokenize_translate(options, recognizer, filename, context):
-    debug = options.debug
-    should_translate = options.Translate
+def _check(cancel):
+    if cancel:
+        cancel.check()
+
 
+def _recognize(options, recognizer, filename, context, cancel=None):
+    """
+    Runs OCR and, if the result passes the quality gate, starts translating.
+    Returns RichData without tokens (check its quality) and the pending translation
+    """
     _logger.debug("recognizing...")
-    raw_data = recognizer.recognize(filename, context)
+    with metrics.timer("recognize"):
+        raw_data = recognizer.recognize(
+            filename, context, cancel=cancel, settings=OcrSettings.from_options(options)
+        )
     ldata = raw_data.get_lines()
     text = _get_text(ldata)
 
-    # if _is_junk(ldata):
-    #     _logger.debug("got junk: %s", text)
-    #     return None
+    report = QualityGate.from_options(options).assess(
+        raw_data.get_line_geometry().conf, text
+    )
+    rich_data = RichData(text, None, ldata, [], raw_data, report)
+    if not report.ok:
+        metrics.incr("frames_rejected")
+        _logger.debug("rejected (%s): %s", ", ".join(report.reasons), text)
+        return rich_data, None
+
+    # start translating first, so the request is in flight while tokenizing:
+    pending_translation = None
+    if options.Translate:
+        _logger.debug("translating...")
+        pending_translation = translate_async(
+            text, options.DeepLUrl, options.DeepLKey, cancel
+        )
 
+    return rich_data, pending_translation
+
+
+def _tokenize(rich_data):
     _logger.debug("tokenizing...")
-    tokens = tokenize(text, ldata)
+    with metrics.timer("tokenize"):
+        tokens = tokenize(rich_data.original, rich_data.cdata)
+    return replace(rich_data, tokens=tokens)
 
-    translation = None
-    if should_translate:
-        _logger.debug("translating...")
-        translation = translate(text, options.DeepLUrl, options.DeepLKey)
 
-    return RichData(text, translation, ldata, tokens, raw_data)
+def _await_translation(rich_data, pending_translation, cancel=None):
+    if not pending_translation:
+        return rich_data
+    if cancel:
+        translation = cancel.result(pending_translation)
+    else:
+        translation = pending_translation.result()
+    return replace(rich_data, translation=translation)
 
 
-def process_image_light(path, options, recognizer, context=None):
-    zoritori = _recognize_tokenize_translate(options, recognizer, path, context)
+def _recognize_tokenize_translate(
+    options, recognizer, filename, context, on_update=None, cancel=None
+):
+    """
+    Runs OCR, tokenization and translation. If given, on_update is called with partial
+    RichData as earlier stages finish: OCR boxes first, then tokens while translating.
+    If cancel is cancelled, in-flight work is abandoned and Cancelled is raised
+    """
+    rich_data, pending_translation = _recognize(
+        options, recognizer, filename, context, cancel
+    )
+    _check(cancel)
+    if not rich_data.quality.ok:
+        return None
+    if on_update:
+        on_update(rich_data)
+
+    rich_data = _tokenize(rich_data)
+    _check(cancel)
+    if on_update and pending_translation:
+        on_update(rich_data)
+
+    return _await_translation(rich_data, pending_translation, cancel)
+
+
+def _log_debug(rich_data):
+    _logger.debug("original: %s", rich_data.original)
+    _logger.debug("translation: %s", rich_data.translation)
+    _logger.debug("tokens: %s", rich_data.tokens)
+
+
+def process_image_light(
+    path, options, recognizer, context=None, on_update=None, cancel=None
+):
+    zoritori = _recognize_tokenize_translate(
+        options, recognizer, path, context, on_update, cancel
+    )
     if zoritori and options.debug:
-        log_debug(zoritori)
+        _log_debug(zoritori)
     return zoritori
 
 
-def process_image(options, recognizer, full_path, text_path, context):
-    """Processes an image for vocabulary collection and saving screenshots"""
-    rich_data = _recognize_tokenize_translate(
-        options, recognizer, text_path or full_path, context
-    )
-    if rich_data is None:
-        return None
+def quick_lookup(path, options, recognizer, context=None):
+    """
+    Lightweight profile for secondary clips: single line OCR and dictionary lookups,
+    without translating. The whole text is looked up first, and only tokenized when it
+    isn't a word itself. Returns the lines to show, or None
+    """
+    with metrics.timer("quick_lookup"):
+        settings = replace(
+            OcrSettings.from_options(options), page_mode=SINGLE_LINE_PAGE_MODE
+        )
+        raw_data = recognizer.recognize(path, context, settings=settings)
+        text = "".join(_get_text(raw_data.get_lines()).split())
+        if not text:
+            return None
+        _logger.debug("quick lookup: %s", text)
+
+        entry = dictionary.lookup(text)
+        if entry:
+            return entry
+
+        words = [
+            t.dictionary_form()
+            for t in tokenize(text)
+            if not is_punctuation(t.surface())
+        ]
+        found = dictionary.lookup_many(words)
+        lines = [
+            " | ".join(part for part in found[word] if part)
+            for word in dict.fromkeys(words)
+            if found.get(word)
+        ]
+        return lines or None
+
+
+def _save_notes(notes_dir, rich_data, full_path):
+    text = rich_data.original
+    cleaned_up = text
+    for c in ["<", ">", ":", '"', "/", "\\", "|", "?", "*", "\n"]:
+        cleaned_up = cleaned_up.replace(c, "-")
+        new_filename = (Path(full_path).name).replace("xxxxx", cleaned_up)
+    notes_pic = Path(notes_dir) / new_filename
+    os.rename(full_path, notes_pic)
+    if not save_vocabulary(notes_dir, rich_data.tokens, notes_pic):
+        os.remove(notes_pic)
+
+
+def _persist(options, rich_data, full_path):
+    """Saves the screenshot and vocabulary to the notes folder, if any"""
+    metrics.incr("frames_processed")
     notes_dir = options.NotesFolder
     if notes_dir:
-        text = rich_data.original
-        cleaned_up = text
-        for c in ["<", ">", ":", '"', "/", "\\", "|", "?", "*", "\n"]:
-            cleaned_up = cleaned_up.replace(c, "-")
-            new_filename = (Path(full_path).name).replace("xxxxx", cleaned_up)
-        notes_pic = Path(notes_dir) / new_filename
-        os.rename(full_path, notes_pic)
-        if not save_vocabulary(notes_dir, rich_data.tokens, notes_pic):
-            os.remove(notes_pic)
+        with metrics.timer("persist"):
+            _save_notes(notes_dir, rich_data, full_path)
     _logger.info(rich_data.original)
     if rich_data.translation:
         _logger.info(rich_data.translation)
+
+
+def process_image(
+    options, recognizer, full_path, text_path, context, on_update=None, cancel=None
+):
+    """Processes an image for vocabulary collection and saving screenshots"""
+    rich_data = _recognize_tokenize_translate(
+        options, recognizer, text_path or full_path, context, on_update, cancel
+    )
+    if rich_data is None:
+        return None
+    _check(cancel)
+    _persist(options, rich_data, full_path)
     return rich_data
+
+
+@dataclass
+class Frame:
+    """A screenshot on its way through the staged pipeline"""
+
+    full_path: str
+    text_path: str
+    context: Box
+    seq: int = -1
+    rich_data: RichData = None
+    pending_translation: Future = None
+    token: CancellationToken = field(default_factory=CancellationToken)
+    options: object = None
+    started: float = field(default_factory=time.perf_counter)
+    finished: bool = False
+    translation_ready: bool = False
+
+
+def build_pipeline(
+    options,
+    recognizer,
+    on_result,
+    on_update=None,
+    on_reject=None,
+    on_translation=None,
+    ocr_workers=1,
+    governor=None,
+):
+    """
+    Staged version of process_image: recognize -> tokenize -> translate -> persist,
+    so consecutive frames overlap. Frames go in with submit(Frame(...)), finished
+    RichData comes out through on_result, and stale frames are dropped when OCR falls behind.
+    Submitting a frame cancels the ones still in flight, killing OCR or abandoning translation.
+    Frames that fail the quality gate stop after OCR, and are passed to on_reject if given.
+    A LatencyGovernor, if given, picks each frame's options and is told its latency.
+    With DeferTranslation, frames are published without waiting for DeepL, and the
+    translated RichData goes to on_translation (or on_result) once it arrives, unless a
+    newer frame was published meanwhile
+    """
+    late_lock = threading.Lock()
+    # seq of the newest frame passed to on_result, so late translations never go out over it:
+    newest = -1
+
+    def recognize_stage(frame):
+        frame.options = governor.apply(options) if governor else options
+        path = frame.text_path or frame.full_path
+        frame.rich_data, frame.pending_translation = _recognize(
+            frame.options, recognizer, path, frame.context, frame.token
+        )
+        frame.token.check()
+        if not frame.rich_data.quality.ok:
+            if on_reject:
+                on_reject(frame.rich_data)
+            # rejected, not dropped:
+            raise Filtered()
+        if on_update:
+            on_update(frame.rich_data)
+        return frame
+
+    def tokenize_stage(frame):
+        frame.rich_data = _tokenize(frame.rich_data)
+        frame.token.check()
+        if on_update and frame.pending_translation:
+            on_update(frame.rich_data)
+        return frame
+
+    def translate_stage(frame):
+        pending = frame.pending_translation
+        if pending and frame.options.DeferTranslation and not pending.done():
+            pending.add_done_callback(lambda _: translation_arrived(frame))
+            return frame
+        frame.rich_data = _await_translation(frame.rich_data, pending, frame.token)
+        return frame
+
+    def persist_stage(frame):
+        frame.token.check()
+        _persist(frame.options, frame.rich_data, frame.full_path)
+        return frame
+
+    def finish(frame):
+        nonlocal newest
+        latency = (time.perf_counter() - frame.started) * 1000
+        metrics.observe("end_to_end", latency)
+        if governor:
+            governor.observe(latency)
+        # results go out under the lock, so a late translation can't overtake a newer frame:
+        with late_lock:
+            on_result(frame.rich_data)
+            newest = max(newest, frame.seq)
+            frame.finished = True
+            late = frame.translation_ready
+        if late:
+            publish_translation(frame)
+
+    def translation_arrived(frame):
+        # the frame may still be on its way through the other stages:
+        with late_lock:
+            frame.translation_ready = True
+            finished = frame.finished
+        if finished:
+            publish_translation(frame)
+
+    def publish_translation(frame):
+        pending = frame.pending_translation
+        if frame.token.cancelled or pending.cancelled() or pending.exception():
+            return
+        with late_lock:
+            if frame.seq < newest:
+                _logger.debug("dropped late translation for frame %d", frame.seq)
+                return
+            translated = replace(frame.rich_data, translation=pending.result())
+            (on_translation or on_result)(translated)
+
+    stages = [
+        Stage("recognize", recognize_stage, workers=ocr_workers),
+        Stage("tokenize", tokenize_stage),
+        Stage("translate", translate_stage, workers=2),
+        Stage("persist", persist_stage),
+    ]
+    return StagedPipeline(stages, finish)
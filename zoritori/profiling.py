@@ -0,0 +1,262 @@
+import argparse
+import cProfile
+import io
+import json
+import logging
+import platform
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import zoritori.metrics as metrics
+
+
+_logger = logging.getLogger("zoritori")
+
+# functions whose callees are broken out per stage in the report:
+STAGE_FUNCTIONS = {
+    "capture": "take_screenshots",
+    "change_detection": "_has_screen_changed",
+    "recognize": "recognize_stage",
+    "tokenize": "tokenize_stage",
+    "translate": "translate_stage",
+    "persist": "persist_stage",
+    "deepl": "translate_many",
+    "draw": "_draw",
+}
+MEMORY_INTERVAL = 5.0
+TRACEMALLOC_FRAMES = 10
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 25
+# since 3.12 one profiler sees every thread, before that each thread needs its own:
+PROCESS_WIDE = sys.version_info >= (3, 12)
+
+
+class SessionProfiler:
+    """
+    Profiles a whole session with cProfile and tracemalloc, sampling memory every
+    memory_interval seconds. stop() writes the reports to a new folder under root
+    """
+
+    def __init__(self, root, memory_interval=MEMORY_INTERVAL):
+        self.started = datetime.now()
+        self.folder = Path(root) / (
+            "profile-" + self.started.strftime("%Y-%m-%d_%H-%M-%S")
+        )
+        self._memory_interval = memory_interval
+        self._profiles = []
+        self._profiles_lock = threading.Lock()
+        self._local = threading.local()
+        self._timeline = []
+        self._stopped = threading.Event()
+        self._sampler = None
+        self._start_time = None
+        self._first_snapshot = None
+
+    def start(self):
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        self._first_snapshot = tracemalloc.take_snapshot()
+        self._start_time = time.perf_counter()
+        self._sample_memory()
+        self._sampler = threading.Thread(
+            target=self._sample_loop, name="profiler-memory", daemon=True
+        )
+        self._sampler.start()
+        if PROCESS_WIDE:
+            self._enable()
+        return self
+
+    def _enable(self):
+        profile = cProfile.Profile()
+        profile.enable()
+        with self._profiles_lock:
+            self._profiles.append(profile)
+        return profile
+
+    @contextmanager
+    def thread_scope(self):
+        """Profiles the calling thread for the duration of the block, where that's needed"""
+        if PROCESS_WIDE or getattr(self._local, "profile", None):
+            yield
+            return
+        self._local.profile = self._enable()
+        try:
+            yield
+        finally:
+            self._local.profile.disable()
+
+    def _sample_memory(self):
+        current, peak = tracemalloc.get_traced_memory()
+        elapsed = time.perf_counter() - self._start_time
+        self._timeline.append(
+            {
+                "seconds": round(elapsed, 1),
+                "current_kb": current // 1024,
+                "peak_kb": peak // 1024,
+            }
+        )
+
+    def _sample_loop(self):
+        while not self._stopped.wait(self._memory_interval):
+            self._sample_memory()
+
+    def stop(self):
+        """Stops profiling and writes the reports, returns the report folder"""
+        self._stopped.set()
+        self._sample_memory()
+        with self._profiles_lock:
+            profiles = list(self._profiles)
+        for profile in profiles:
+            profile.disable()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        self.folder.mkdir(parents=True, exist_ok=True)
+        stats = pstats.Stats(*profiles) if profiles else None
+        if stats:
+            stats.dump_stats(self.folder / "session.pstats")
+            (self.folder / "functions.txt").write_text(
+                _function_report(stats), encoding="utf-8"
+            )
+        (self.folder / "memory.txt").write_text(
+            _memory_report(snapshot, self._first_snapshot, self._timeline),
+            encoding="utf-8",
+        )
+        summary = self._summary(stats, snapshot)
+        (self.folder / "summary.json").write_text(
+            json.dumps(summary, indent=2), encoding="utf-8"
+        )
+        _logger.info("wrote profile to %s", self.folder)
+        return self.folder
+
+    def _summary(self, stats, snapshot):
+        return {
+            "started": self.started.isoformat(timespec="seconds"),
+            "duration_s": round(time.perf_counter() - self._start_time, 1),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "stages": _stage_times(stats) if stats else {},
+            "metrics": metrics.snapshot(),
+            "memory": {
+                "timeline": self._timeline,
+                "top_allocations": [
+                    {"where": str(stat.traceback[0]), "kb": stat.size // 1024}
+                    for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+                ],
+            },
+        }
+
+
+def _find(stats, function_name):
+    return [key for key in stats.stats if key[2] == function_name]
+
+
+def _stage_times(stats):
+    """Calls and cumulative seconds of each stage's entry function"""
+    times = {}
+    for stage, function_name in STAGE_FUNCTIONS.items():
+        keys = _find(stats, function_name)
+        if keys:
+            times[stage] = {
+                "calls": sum(stats.stats[key][1] for key in keys),
+                "cumulative_s": round(sum(stats.stats[key][3] for key in keys), 4),
+            }
+    return times
+
+
+def _function_report(stats):
+    out = io.StringIO()
+    stats.stream = out
+    out.write("=== top functions by cumulative time ===\n")
+    stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+    for stage, function_name in STAGE_FUNCTIONS.items():
+        if _find(stats, function_name):
+            out.write(f"\n=== {stage} ({function_name}) ===\n")
+            stats.print_callees(rf"\({function_name}\)$")
+    return out.getvalue()
+
+
+def _memory_report(snapshot, first_snapshot, timeline):
+    out = io.StringIO()
+    out.write("=== allocation hotspots ===\n")
+    for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+        out.write(f"{stat}\n")
+    out.write("\n=== growth since start ===\n")
+    for stat in snapshot.compare_to(first_snapshot, "lineno")[:TOP_ALLOCATIONS]:
+        out.write(f"{stat}\n")
+    out.write("\n=== traced memory over time ===\n")
+    for sample in timeline:
+        out.write(
+            f"{sample['seconds']:>8}s  current {sample['current_kb']} KiB  peak {sample['peak_kb']} KiB\n"
+        )
+    return out.getvalue()
+
+
+_profiler = None
+
+
+def start(root):
+    """Starts profiling the session, reports are written under root on stop()"""
+    global _profiler
+    _profiler = SessionProfiler(root).start()
+    return _profiler
+
+
+def stop():
+    global _profiler
+    profiler, _profiler = _profiler, None
+    return profiler.stop() if profiler else None
+
+
+@contextmanager
+def thread_scope():
+    """Wrap long running threads in this so they're included in the session profile"""
+    if _profiler is None:
+        yield
+    else:
+        with _profiler.thread_scope():
+            yield
+
+
+def compare(before, after):
+    """Compares two summary.json files, returns lines of per-stage and memory changes"""
+    before = json.loads(Path(before).read_text(encoding="utf-8"))
+    after = json.loads(Path(after).read_text(encoding="utf-8"))
+    lines = []
+    for stage in STAGE_FUNCTIONS:
+        a = before["stages"].get(stage)
+        b = after["stages"].get(stage)
+        if not a or not b:
+            continue
+        per_call_a = a["cumulative_s"] / max(a["calls"], 1) * 1000
+        per_call_b = b["cumulative_s"] / max(b["calls"], 1) * 1000
+        lines.append(
+            f"{stage:<18} {per_call_a:9.2f}ms -> {per_call_b:9.2f}ms per call"
+            f" ({per_call_b - per_call_a:+.2f}ms)"
+        )
+    peak_a = max((s["peak_kb"] for s in before["memory"]["timeline"]), default=0)
+    peak_b = max((s["peak_kb"] for s in after["memory"]["timeline"]), default=0)
+    lines.append(
+        f"{'peak memory':<18} {peak_a:9}KiB -> {peak_b:9}KiB ({peak_b - peak_a:+}KiB)"
+    )
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare two zoritori profile summaries"
+    )
+    parser.add_argument("before", help="summary.json of the baseline run")
+    parser.add_argument("after", help="summary.json of the run to compare")
+    args = parser.parse_args()
+    for line in compare(args.before, args.after):
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
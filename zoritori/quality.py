@@ -0,0 +1,102 @@
+import logging
+import unicodedata
+from dataclasses import dataclass, field
+
+import numpy as np
+
+
+_logger = logging.getLogger("zoritori")
+
+# codepoint ranges counted as Japanese: hiragana and katakana, CJK extension A,
+# CJK unified ideographs, and halfwidth katakana
+JAPANESE_RANGES = np.array(
+    [[0x3040, 0x30FF], [0x3400, 0x4DBF], [0x4E00, 0x9FFF], [0xFF66, 0xFF9F]],
+    dtype=np.uint32,
+)
+
+
+@dataclass
+class QualityReport:
+    """Features of an OCR result, and why it was rejected (if it was)"""
+
+    characters: int
+    median_confidence: float
+    ascii_ratio: float
+    japanese_ratio: float
+    reasons: list[str] = field(default_factory=list)
+
+    @property
+    def ok(self):
+        return not self.reasons
+
+
+def _codepoints(text):
+    chars = "".join(text.split())
+    return np.frombuffer(chars.encode("utf-32-le"), dtype=np.uint32)
+
+
+def _is_cjk_symbol(codepoints):
+    """Non-ASCII punctuation and symbols, like 、。「」？！…"""
+    return np.array(
+        [
+            c >= 128 and unicodedata.category(chr(c))[0] in ("P", "S")
+            for c in codepoints
+        ],
+        dtype=bool,
+    )
+
+
+def _in_ranges(codepoints, ranges):
+    above = codepoints[:, None] >= ranges[:, 0]
+    below = codepoints[:, None] <= ranges[:, 1]
+    return (above & below).any(axis=1)
+
+
+@dataclass
+class QualityGate:
+    """
+    Rejects OCR results that are probably junk before they're tokenized, translated
+    or saved. Each check is skipped when its threshold is 0 (or 1 for max_ascii_ratio)
+    """
+
+    min_confidence: float = 50.0
+    max_ascii_ratio: float = 0.25
+    min_japanese_ratio: float = 0.5
+    min_characters: int = 1
+
+    @classmethod
+    def from_options(cls, options):
+        return cls(
+            options.MinConfidence,
+            options.MaxAsciiRatio,
+            options.MinJapaneseRatio,
+            options.MinCharacters,
+        )
+
+    def assess(self, conf, text):
+        """Checks per-character confidences (an array) and the recognized text"""
+        codepoints = _codepoints(text)
+        n = len(codepoints)
+        if n:
+            ascii_ratio = float(np.count_nonzero(codepoints < 128)) / n
+            # leave punctuation out, so short lines like 「え？」 aren't rejected:
+            letters = ~_is_cjk_symbol(codepoints)
+            japanese = _in_ranges(codepoints, JAPANESE_RANGES) & letters
+            n_letters = np.count_nonzero(letters)
+            japanese_ratio = (
+                float(np.count_nonzero(japanese)) / n_letters if n_letters else 1.0
+            )
+        else:
+            ascii_ratio = japanese_ratio = 0.0
+        median_confidence = float(np.median(conf)) if len(conf) else 0.0
+        report = QualityReport(n, median_confidence, ascii_ratio, japanese_ratio)
+
+        if n < self.min_characters:
+            report.reasons.append(f"{n} characters")
+        if self.min_confidence and median_confidence < self.min_confidence:
+            report.reasons.append(f"median confidence {median_confidence:.0f}")
+        if n and self.max_ascii_ratio < 1 and ascii_ratio > self.max_ascii_ratio:
+            report.reasons.append(f"{ascii_ratio:.0%} ascii")
+        if n and self.min_japanese_ratio and japanese_ratio < self.min_japanese_ratio:
+            report.reasons.append(f"{japanese_ratio:.0%} kana/kanji")
+        return report
@@ -0,0 +1,9 @@
+def create_recognizer(options):
+    """Creates the recognizer for the configured OCR engine"""
+    if options.Engine == "google":
+        from zoritori.recognizers.google_vision import Recognizer
+
+        return Recognizer()
+    from zoritori.recognizers.tesseract import Recognizer
+
+    return Recognizer(options.TesseractExePath)
@@ -18,8 +18,11 @@ class Recognizer:
     def __init__(self):
         self._client = vision.ImageAnnotatorClient()
 
-    def recognize(self, path: str, context=None) -> RawData:
+    def recognize(self, path: str, context=None, cancel=None, settings=None) -> RawData:
         response = self._detect_text(path)
+        # the request can't be aborted, but its result can be discarded:
+        if cancel:
+            cancel.check()
         return self._collect_symbols(response, context)
 
     def _detect_text(self, path):
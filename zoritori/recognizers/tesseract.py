@@ -1,5 +1,6 @@
 import logging
-from io import StringIO
+import subprocess
+from io import BytesIO, StringIO
 from csv import DictReader
 from statistics import median, mean
 from itertools import groupby
@@ -8,7 +9,8 @@ from dataclasses import dataclass
 import pytesseract
 from PIL import Image
 
-from zoritori.types import CharacterData, BlockData, RawData, Box
+import zoritori.tracing as tracing
+from zoritori.types import CharacterData, BlockData, RawData, Box, OcrSettings
 
 
 _logger = logging.getLogger("zoritori")
@@ -23,6 +25,12 @@ def _cast(row):
             row[key] = int(value)
 
 
+def _unscale(row, scale):
+    """Maps box data from a resized image back to the original"""
+    for key in ("left", "top", "width", "height"):
+        row[key] = round(row[key] / scale)
+
+
 def _split(row):
     """Split a multi character into individual characters"""
     # tesseract sometimes returns multiple characters together,
@@ -54,19 +62,22 @@ def _fix_line_numbers(cdata):
     def skip_line_break():
         nonlocal idx
         while idx < len(cdata) and _probably_line_break(cdata[idx]):
-            text = cdata[idx]["text"]
-            _logger.debug(f"skipping whitespace {idx} '{text}'")
+            if tracing.enabled:
+                tracing.instant("skip whitespace", idx=idx, text=cdata[idx]["text"])
             idx += 1
 
     skip_line_break()
     while idx < len(cdata):
-        text = cdata[idx]["text"]
         if _probably_line_break(cdata[idx]):
             line_number += 1
-            _logger.debug(f"incrementing line number {idx} '{text}' {line_number}")
+            if tracing.enabled:
+                tracing.instant("line break", idx=idx, line=line_number)
             skip_line_break()
         else:
-            _logger.debug(f"setting line number {idx} '{text}' {line_number}")
+            if tracing.enabled:
+                tracing.instant(
+                    "set line", idx=idx, text=cdata[idx]["text"], line=line_number
+                )
             cdata[idx]["line_num"] = line_number
             idx += 1
 
@@ -121,7 +132,7 @@ def _calculate_boxes(actuals, context, lines):
                     estimated_top,
                     estimated_cwidth,
                     estimated_cheight,
-                    context
+                    context,
                 )
             d["box"] = box
 
@@ -133,12 +144,7 @@ def _convert_to_cdata(lines: list[dict]) -> list[[CharacterData]]:
     """Convert Tesseract tsv rows to CharacterData"""
 
     def _row_to_cdata(row):
-        return CharacterData(
-            row["text"],
-            row["line_num"],
-            row["conf"],
-            row["box"]
-        )
+        return CharacterData(row["text"], row["line_num"], row["conf"], row["box"])
 
     return [[_row_to_cdata(row) for row in line] for line in lines]
 
@@ -161,24 +167,77 @@ def _get_box_for_block(cdata, context):
     return Box(first.left, first.top, w, h, context)
 
 
+def _config(settings):
+    return f"--psm {settings.page_mode}" if settings.page_mode else ""
+
+
+def _run_tesseract(tesseract_cmd, path, settings, cancel, image=None):
+    """
+    Runs tesseract in a child process that is killed if cancel is cancelled, returns tsv.
+    If image (PNG bytes) is given, it's piped to tesseract instead of reading path
+    """
+    args = [tesseract_cmd, "stdin" if image else str(path), "stdout"]
+    args += ["-l", settings.lang, *_config(settings).split(), "tsv"]
+    # pytesseract's arguments hide the console window that would flash up on Windows:
+    try:
+        process = subprocess.Popen(args, **pytesseract.pytesseract.subprocess_args())
+    except FileNotFoundError:
+        raise pytesseract.TesseractNotFoundError()
+    cancel.on_cancel(process.kill)
+    out, err = process.communicate(image)
+    cancel.check()
+    if process.returncode != 0:
+        raise pytesseract.TesseractError(
+            process.returncode, err.decode(errors="replace")
+        )
+    return out.decode()
+
+
 class Recognizer:
     def __init__(self, tesseract_cmd, actual_boxes=False):
         pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+        self.tesseract_cmd = tesseract_cmd
         self.actual_boxes = actual_boxes
 
-    def recognize(self, path: str, context=None) -> RawData:
+    def recognize(self, path: str, context=None, cancel=None, settings=None) -> RawData:
         """
         Extract character data from image (expected path to image file), returns parsed Tesseract data
         Tesseract data headers:
         level, page_num, block_num, par_num, line_num, word_num, left, top, width, height, conf, text
+        If cancel (a CancellationToken) is cancelled, tesseract is killed and Cancelled is raised.
+        settings (OcrSettings) picks the language model, page segmentation mode and image scale
         """
-        tsv = pytesseract.image_to_data(Image.open(path), lang="jpn")
-        _logger.debug(f"raw tsv from Tesseract:\n{tsv}")
+        settings = settings or OcrSettings()
+        scaled = settings.scale != 1.0
+        image = None
+        if scaled:
+            image = Image.open(path)
+            size = (
+                round(image.width * settings.scale),
+                round(image.height * settings.scale),
+            )
+            image = image.resize(size, Image.BILINEAR)
+        if cancel:
+            png = None
+            if scaled:
+                buffer = BytesIO()
+                image.save(buffer, format="PNG")
+                png = buffer.getvalue()
+            tsv = _run_tesseract(self.tesseract_cmd, path, settings, cancel, png)
+        else:
+            tsv = pytesseract.image_to_data(
+                image or Image.open(path), lang=settings.lang, config=_config(settings)
+            )
+        _logger.debug("raw tsv from Tesseract:\n%s", tsv)
+        if tracing.enabled:
+            tracing.instant("tesseract tsv", rows=tsv.count("\n"))
         f = StringIO(tsv)
         reader = DictReader(f, delimiter="\t")
         lines = []
         for row in reader:
             _cast(row)
+            if scaled:
+                _unscale(row, settings.scale)
             # leave single characters and whitespace alone:
             if len(row["text"]) <= 1:
                 lines.append(row)
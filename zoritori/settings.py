@@ -4,10 +4,18 @@ from zoritori.types import Root, Box
 from zoritori.files import load_json, save_json
 
 
-def get_settings_path():
+def _get_dot_zoritori():
     dot_zoritori = Path.home() / ".zoritori"
     Path(dot_zoritori).mkdir(parents=True, exist_ok=True)
-    return dot_zoritori / "settings.json"
+    return dot_zoritori
+
+
+def get_settings_path():
+    return _get_dot_zoritori() / "settings.json"
+
+
+def get_cache_path(filename):
+    return _get_dot_zoritori() / filename
 
 
 def load_clips(path):
@@ -0,0 +1,67 @@
+from bisect import bisect_right
+from itertools import accumulate, groupby
+
+
+class _Line:
+    """Tokens on one line, sorted by left edge"""
+
+    def __init__(self, entries):
+        # entries are (left, right, top, bottom, order, token)
+        entries.sort(key=lambda e: e[0])
+        self.entries = entries
+        self.lefts = [e[0] for e in entries]
+        # running max of right edges, so a scan to the left can stop early:
+        self.max_rights = list(accumulate((e[1] for e in entries), max))
+        self.top = min(e[2] for e in entries)
+        self.bottom = max(e[3] for e in entries)
+
+    def find(self, x, y):
+        best = None
+        i = bisect_right(self.lefts, x) - 1
+        while i >= 0 and self.max_rights[i] > x:
+            left, right, top, bottom, order, token = self.entries[i]
+            if x < right and top <= y < bottom:
+                if best is None or order < best[0]:
+                    best = (order, token)
+            i -= 1
+        return best
+
+
+class TokenIndex:
+    """
+    Point lookup over token boxes (in client coordinates), built once per set of tokens.
+    Lines are searched by top edge and tokens within a line by left edge, both via bisection
+    """
+
+    def __init__(self, tokens):
+        entries = []
+        for order, token in enumerate(tokens):
+            box = token.box()
+            left = box.clientx
+            top = box.clienty
+            entries.append(
+                (left, left + box.width, top, top + box.height, order, token)
+            )
+        lines = [
+            _Line(list(it)) for _, it in groupby(entries, lambda e: e[5].line_num())
+        ]
+        lines.sort(key=lambda line: line.top)
+        self._lines = lines
+        self._tops = [line.top for line in lines]
+        self._max_bottoms = list(accumulate((line.bottom for line in lines), max))
+
+    def __len__(self):
+        return sum(len(line.entries) for line in self._lines)
+
+    def find(self, x, y):
+        """Returns the first token whose box contains the point, or None"""
+        best = None
+        i = bisect_right(self._tops, y) - 1
+        while i >= 0 and self._max_bottoms[i] > y:
+            line = self._lines[i]
+            if y < line.bottom:
+                found = line.find(x, y)
+                if found and (best is None or found[0] < best[0]):
+                    best = found
+            i -= 1
+        return best[1] if best else None
@@ -0,0 +1,225 @@
+import itertools
+import logging
+import threading
+from collections import deque
+
+import zoritori.metrics as metrics
+import zoritori.profiling as profiling
+import zoritori.tracing as tracing
+from zoritori.cancellation import Cancelled
+
+
+_logger = logging.getLogger("zoritori")
+
+
+class Filtered(Exception):
+    """Raised by a stage for an item it has dealt with itself, which leaves without being dropped"""
+
+
+class LatestQueue:
+    """
+    Bounded queue that never blocks producers: when full, the oldest item is dropped
+    so consumers always get the newest work
+    """
+
+    def __init__(self, maxsize=1):
+        self._items = deque()
+        self._maxsize = maxsize
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        """Adds item, returns the item it displaced (or None)"""
+        with self._cond:
+            displaced = None
+            if len(self._items) >= self._maxsize:
+                displaced = self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+            return displaced
+
+    def get(self, timeout=None):
+        """Returns the next item, or None once closed or after timeout"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._items or self._closed, timeout)
+            if self._items:
+                return self._items.popleft()
+            return None
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._items.clear()
+            self._cond.notify_all()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+
+class Stage:
+    """
+    One step of a StagedPipeline: func(item) runs on a pool of worker threads.
+    Returning None drops the item, raising Filtered ends it quietly, and anything
+    else is handed to the next stage
+    """
+
+    def __init__(self, name, func, workers=1, maxsize=1):
+        self.name = name
+        self.input = LatestQueue(maxsize)
+        self.stale = 0
+        self.cancelled = 0
+        self.filtered = 0
+        self._func = func
+        self._workers = workers
+        self._threads = []
+        self._emit = None
+        self._drop = None
+        self._done = None
+        self._last_seq = -1
+        self._lock = threading.Lock()
+
+    def start(self, emit, drop, done=None):
+        """
+        Starts the workers, which pass results to emit, discarded items to drop,
+        and filtered items to done
+        """
+        self._emit = emit
+        self._drop = drop
+        self._done = done
+        for i in range(self._workers):
+            thread = threading.Thread(
+                target=self._run, name=f"stage-{self.name}-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def put(self, item):
+        displaced = self.input.put(item)
+        if displaced is not None:
+            self._drop(displaced)
+
+    def _is_stale(self, item):
+        token = getattr(item, "token", None)
+        return item.seq <= self._last_seq or (token is not None and token.cancelled)
+
+    def _run(self):
+        with profiling.thread_scope():
+            self._work()
+
+    def _work(self):
+        while True:
+            item = self.input.get()
+            if item is None:
+                return
+            with self._lock:
+                stale = self._is_stale(item)
+            if stale:
+                self.stale += 1
+                self._drop(item)
+                continue
+            try:
+                with tracing.span(self.name, seq=item.seq):
+                    result = self._func(item)
+            except Cancelled:
+                _logger.debug("stage %s cancelled item %d", self.name, item.seq)
+                self.cancelled += 1
+                result = None
+            except Filtered:
+                self.filtered += 1
+                if self._done:
+                    self._done(item)
+                continue
+            except Exception:
+                _logger.exception("stage %s failed", self.name)
+                result = None
+            with self._lock:
+                # with several workers a newer item can finish first, outputs stay in order:
+                stale = result is not None and self._is_stale(result)
+                if result is not None and not stale:
+                    self._last_seq = result.seq
+            if stale:
+                self.stale += 1
+            if result is None or stale:
+                self._drop(item)
+            else:
+                self._emit(result)
+
+    def stop(self):
+        self.input.close()
+
+
+class StagedPipeline:
+    """
+    Runs items through stages connected by bounded latest-wins queues, so consecutive
+    items overlap and, when a stage falls behind, stale items are skipped in favour
+    of the newest one. Items need a writable seq attribute, which submit() assigns.
+    Items with a CancellationToken in their token attribute are cancelled as soon as
+    a newer item is submitted, so stages can abandon work that is already running
+    """
+
+    def __init__(self, stages, on_result):
+        self.stages = stages
+        self._on_result = on_result
+        self._seq = itertools.count()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        for stage, following in zip(stages, stages[1:] + [None]):
+            stage.start(
+                following.put if following else self._finish, self._dropped, self._done
+            )
+
+    def _done(self, item):
+        with self._lock:
+            self._in_flight.pop(item.seq, None)
+
+    def _dropped(self, item):
+        _logger.debug("pipeline dropped item %d", item.seq)
+        metrics.incr("frames_dropped")
+        tracing.instant("dropped", seq=item.seq)
+        token = getattr(item, "token", None)
+        if token is not None:
+            token.cancel()
+        self._done(item)
+
+    def _finish(self, item):
+        try:
+            self._on_result(item)
+        except Exception:
+            _logger.exception("pipeline result handler failed")
+        finally:
+            self._done(item)
+
+    def submit(self, item):
+        with self._lock:
+            item.seq = next(self._seq)
+            superseded = list(self._in_flight.values())
+            self._in_flight[item.seq] = item
+        for old in superseded:
+            token = getattr(old, "token", None)
+            if token is not None:
+                token.cancel()
+        self.stages[0].put(item)
+        return item
+
+    def busy(self):
+        """True while any submitted item is still queued or being worked on"""
+        with self._lock:
+            return len(self._in_flight) > 0
+
+    def stats(self):
+        return {
+            stage.name: {
+                "dropped": stage.input.dropped,
+                "stale": stage.stale,
+                "cancelled": stage.cancelled,
+                "filtered": stage.filtered,
+            }
+            for stage in self.stages
+        }
+
+    def stop(self):
+        for stage in self.stages:
+            stage.stop()
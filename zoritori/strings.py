@@ -47,3 +47,24 @@ def all_kana(s):
         return point < hupper and point > hlower or point < kupper and point > klower
 
     return all(is_kana(c) for c in s)
+
+
+# punctuation that changes what a sentence means, so it stays in normalized keys:
+MEANINGFUL_PUNCTUATION = {"?", "!"}
+
+
+def _is_key_char(c):
+    if c.isspace():
+        return False
+    if c in MEANINGFUL_PUNCTUATION:
+        return True
+    return unicodedata.category(c)[0] not in ("P", "S")
+
+
+def normalize_japanese(s):
+    """
+    Normalizes OCR'd Japanese text for use as a lookup key: folds full/half width forms,
+    drops whitespace and line breaks, and strips brackets, commas and full stops, and
+    stray symbols. Question and exclamation marks are kept
+    """
+    return "".join(filter(_is_key_char, unicodedata.normalize("NFKC", s)))
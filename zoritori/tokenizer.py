@@ -1,12 +1,97 @@
+import functools
 import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
 
 from sudachipy import tokenizer, dictionary
 
-from zoritori.types import Token, CharacterData, MergedName
+from zoritori.types import Token, CharacterData, MergedName, FrozenMorpheme
 
 
 _logger = logging.getLogger("zoritori")
 
+SPLIT_MODES = {
+    "A": tokenizer.Tokenizer.SplitMode.A,
+    "B": tokenizer.Tokenizer.SplitMode.B,
+    "C": tokenizer.Tokenizer.SplitMode.C,
+}
+EDITIONS = ["small", "core", "full"]
+CACHE_SIZE = 512
+POOL_MIN_TEXTS = 32  # below this, starting worker processes costs more than it saves
+
+
+class TokenizerService:
+    """Loads the Sudachi dictionary once and hands out one tokenizer per thread"""
+
+    def __init__(self, split_mode="A", edition="core"):
+        if split_mode not in SPLIT_MODES:
+            raise ValueError(f"unknown Sudachi split mode: {split_mode}")
+        if edition not in EDITIONS:
+            raise ValueError(f"unknown Sudachi dictionary edition: {edition}")
+        self._split_mode = split_mode
+        self._edition = edition
+        self._dictionary = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._warm_thread = None
+
+    @property
+    def split_mode(self):
+        return self._split_mode
+
+    @property
+    def edition(self):
+        return self._edition
+
+    def _get_dictionary(self):
+        # loading the system dictionary is the expensive part, do it once:
+        if self._dictionary is None:
+            with self._lock:
+                if self._dictionary is None:
+                    _logger.debug("loading Sudachi dictionary (%s)", self._edition)
+                    self._dictionary = dictionary.Dictionary(dict=self._edition)
+        return self._dictionary
+
+    def get_tokenizer(self):
+        """Returns the tokenizer for the calling thread, creating it if needed"""
+        # Sudachi tokenizers are not safe to share between threads:
+        tokenizer_obj = getattr(self._local, "tokenizer", None)
+        if tokenizer_obj is None:
+            mode = SPLIT_MODES[self._split_mode]
+            tokenizer_obj = self._get_dictionary().create(mode=mode)
+            self._local.tokenizer = tokenizer_obj
+        return tokenizer_obj
+
+    def warm_up(self):
+        """Loads the dictionary in a background thread, so the first refresh doesn't pay for it"""
+        if self._warm_thread is None:
+            self._warm_thread = threading.Thread(
+                target=self._get_dictionary, name="sudachi-warm-up", daemon=True
+            )
+            self._warm_thread.start()
+        return self._warm_thread
+
+    def tokenize(self, text):
+        """Returns the raw Sudachi morphemes for the text"""
+        return self.get_tokenizer().tokenize(text, SPLIT_MODES[self._split_mode])
+
+
+_service = TokenizerService()
+
+
+def configure(split_mode="A", edition="core"):
+    """Replaces the shared tokenizer service, e.g. after reading options"""
+    global _service
+    if split_mode != _service.split_mode or edition != _service.edition:
+        _service = TokenizerService(split_mode, edition)
+        _analyze.cache_clear()
+    return _service
+
+
+def get_service():
+    return _service
+
 
 def _convert(morphemes, ldata):
     line_num = 0
@@ -55,17 +140,7 @@ def _merge_names(morphemes):
     return result
 
 
-def tokenize(text: str, ldata: list[list[CharacterData]] = None) -> list[Token]:
-    """Break text up into morphemes using Sudachi"""
-
-    # for testing without OCR:
-    if not ldata:
-        lines = text.split("\n")
-        ldata = [list(line) for line in lines]
-
-    tokenizer_obj = dictionary.Dictionary().create()
-    mode = tokenizer.Tokenizer.SplitMode.A
-    morphemes = tokenizer_obj.tokenize(text, mode)
+def _log_morphemes(morphemes):
     for m in morphemes:
         part_of_speech = m.part_of_speech()[0]
         if part_of_speech == "空白":
@@ -78,5 +153,75 @@ def tokenize(text: str, ldata: list[list[CharacterData]] = None) -> list[Token]:
                 m.reading_form(),
                 m.part_of_speech(),
             )
-    morphemes = _merge_names(morphemes)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _analyze(text, split_mode):
+    """Morphemes for the text with names merged, memoized since the same text comes up repeatedly"""
+    morphemes = _service.tokenize(text)
+    if _logger.isEnabledFor(logging.DEBUG):
+        _log_morphemes(morphemes)
+    # detach from the MorphemeList, so cached results don't keep it alive:
+    morphemes = [FrozenMorpheme.from_morpheme(m) for m in morphemes]
+    return tuple(_merge_names(morphemes))
+
+
+def _default_ldata(text):
+    # for testing without OCR:
+    lines = text.split("\n")
+    return [list(line) for line in lines]
+
+
+def tokenize(text: str, ldata: list[list[CharacterData]] = None) -> list[Token]:
+    """Break text up into morphemes using Sudachi"""
+    if not ldata:
+        ldata = _default_ldata(text)
+    morphemes = _analyze(text, _service.split_mode)
     return _convert(morphemes, ldata)
+
+
+def _init_worker(split_mode, edition):
+    configure(split_mode, edition)
+
+
+def _analyze_in_worker(text):
+    return _analyze(text, _service.split_mode)
+
+
+def tokenize_many(
+    texts: list[str],
+    ldatas: list[list[list[CharacterData]]] = None,
+    processes: int = None,
+) -> list[list[Token]]:
+    """
+    Tokenize many texts with one tokenizer, returns a list of tokens for each text.
+    If processes is given, large batches are analyzed across a pool of worker processes
+    """
+    texts = list(texts)
+    if ldatas is None:
+        ldatas = [None] * len(texts)
+    elif len(ldatas) != len(texts):
+        raise ValueError("expected one ldata for each text")
+
+    split_mode = _service.split_mode
+    if processes and processes > 1 and len(texts) >= POOL_MIN_TEXTS:
+        unique = list(dict.fromkeys(texts))
+        with ProcessPoolExecutor(
+            max_workers=processes,
+            initializer=_init_worker,
+            initargs=(split_mode, _service.edition),
+            # forked workers could inherit a lock held by the warm up thread, and hang:
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            chunksize = max(1, len(unique) // (processes * 4))
+            analyzed = executor.map(_analyze_in_worker, unique, chunksize=chunksize)
+            analyses = dict(zip(unique, analyzed))
+        morphemes = [analyses[text] for text in texts]
+    else:
+        _service.get_tokenizer()  # create once up front, every text below reuses it
+        morphemes = [_analyze(text, split_mode) for text in texts]
+
+    return [
+        _convert(m, ldata or _default_ldata(text))
+        for text, m, ldata in zip(texts, morphemes, ldatas)
+    ]
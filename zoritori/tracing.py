@@ -0,0 +1,114 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from pathlib import Path
+
+
+_logger = logging.getLogger("zoritori")
+
+BUFFER_SIZE = 100_000
+
+# checked by callers before building event arguments, so tracing costs one
+# attribute lookup when it's off:
+enabled = False
+_events = deque(maxlen=BUFFER_SIZE)
+_thread_names = {}
+_NULL_SPAN = nullcontext()
+
+
+def _now_us():
+    return time.perf_counter_ns() // 1000
+
+
+def _tid():
+    tid = threading.get_ident()
+    if tid not in _thread_names:
+        _thread_names[tid] = threading.current_thread().name
+    return tid
+
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = _now_us()
+        return self
+
+    def __exit__(self, *exc):
+        complete(self.name, self.start, _now_us(), **self.args)
+
+
+def configure(on, buffer_size=BUFFER_SIZE):
+    """Turns tracing on or off, keeping at most buffer_size of the newest events"""
+    global enabled, _events
+    _events = deque(maxlen=buffer_size)
+    _thread_names.clear()
+    enabled = on
+
+
+def span(name, **args):
+    """Context manager recording a duration event for its block"""
+    if not enabled:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def complete(name, start_us, end_us, **args):
+    """Records a duration event that has already finished"""
+    if enabled:
+        _events.append(("X", name, start_us, end_us - start_us, _tid(), args))
+
+
+def instant(name, **args):
+    """Records a point in time event"""
+    if enabled:
+        _events.append(("i", name, _now_us(), 0, _tid(), args))
+
+
+def events():
+    """Returns the buffered events in Chrome trace format"""
+    pid = os.getpid()
+    trace = [
+        {
+            "name": "thread_name",
+            "ph": "M",
+            "pid": pid,
+            "tid": tid,
+            "args": {"name": name},
+        }
+        for tid, name in list(_thread_names.items())
+    ]
+    for ph, name, ts, dur, tid, args in list(_events):
+        event = {"name": name, "ph": ph, "ts": ts, "pid": pid, "tid": tid}
+        if ph == "X":
+            event["dur"] = dur
+        else:
+            event["s"] = "t"
+        if args:
+            event["args"] = args
+        trace.append(event)
+    return trace
+
+
+def export(path):
+    """Writes buffered events as Chrome trace JSON, viewable in chrome://tracing or Perfetto"""
+    path = Path(path)
+    path.write_text(
+        json.dumps({"traceEvents": events(), "displayTimeUnit": "ms"}, default=str),
+        encoding="utf-8",
+    )
+    _logger.info("wrote trace to %s", path)
+    return path
+
+
+def export_at_exit(path):
+    atexit.register(export, path)
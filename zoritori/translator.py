@@ -1,50 +1,296 @@
 import json
 import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.client import HTTPException
 from json.decoder import JSONDecodeError
-from urllib import request, parse
-from urllib.error import URLError, HTTPError
+from urllib import parse
+
+import zoritori.metrics as metrics
+from zoritori.cache import LRUCache, DiskCache, MISSING
+from zoritori.http_pool import ConnectionPool
+from zoritori.strings import normalize_japanese
 
 deepl_error_message = "Translate via DeepL was unsuccessful."
 _logger = logging.getLogger("zoritori")
 
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MEMORY_CACHE_SIZE = 1024
+# DeepL accepts at most 50 texts per request
+MAX_BATCH_TEXTS = 50
+BATCH_WINDOW = 0.02
+# longest wait between retries, a longer Retry-After gives up instead of holding a worker:
+MAX_RETRY_DELAY = 5.0
+
 
-def _parse(body):
-    """Parse JSON from DeepL translation API, returns first translated string"""
+def _parse(body, count=1):
+    """Parse JSON from DeepL translation API, returns list of count translated strings"""
     try:
         parsed = json.loads(body)
-        return parsed["translations"][0]["text"]
+        translations = [t["text"] for t in parsed["translations"]]
+        if len(translations) == count:
+            return translations
+        _logger.error(
+            f"{deepl_error_message} Expected {count} translations, got {len(translations)}"
+        )
     except JSONDecodeError:
         _logger.error(f"{deepl_error_message} Caught JSONDecodeError, bad JSON: {body}")
     except KeyError:
         _logger.error(f"{deepl_error_message} Caught KeyError, unexpected JSON: {body}")
-    except IndexError:
-        _logger.error(
-            f"{deepl_error_message} Caught IndexError, unexpected JSON: {body}"
+    except TypeError:
+        _logger.error(f"{deepl_error_message} No response body")
+    return [None] * count
+
+
+class TranslationCache:
+    """
+    Translations keyed by normalized Japanese text, so OCR noise (line breaks, width,
+    stray punctuation) doesn't cause a new request. An in-memory LRU sits in front
+    of a SQLite file, which is limited to max_entries
+    """
+
+    def __init__(self, path=None, max_entries=50_000):
+        self._memory = LRUCache(MEMORY_CACHE_SIZE)
+        self._disk = DiskCache(path, max_entries=max_entries) if path else None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text):
+        key = normalize_japanese(text)
+        translation = self._memory.get(key)
+        if translation is MISSING and self._disk is not None:
+            translation = self._disk.get(key)
+            if translation is not MISSING:
+                self._memory.put(key, translation)
+        if translation is MISSING:
+            self.misses += 1
+            return None
+        self.hits += 1
+        metrics.incr("translations_cached")
+        return translation
+
+    def put(self, text, translation):
+        if translation is None:
+            return
+        key = normalize_japanese(text)
+        self._memory.put(key, translation)
+        if self._disk is not None:
+            self._disk.put(key, translation)
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate()}
+
+    def close(self):
+        if self._disk is not None:
+            self._disk.close()
+
+
+class DeepLClient:
+    """
+    DeepL API client that keeps its HTTPS connections alive between requests,
+    with connect/read timeouts and retries (with backoff) on 429 and 5xx responses.
+    submit() collects texts for batch_window seconds and sends them together in
+    one request on a small thread pool, returning a future per text
+    """
+
+    def __init__(
+        self,
+        url,
+        key,
+        connect_timeout=3.0,
+        read_timeout=10.0,
+        retries=3,
+        backoff=0.5,
+        max_delay=MAX_RETRY_DELAY,
+        workers=2,
+        cache=None,
+        batch_window=BATCH_WINDOW,
+    ):
+        self._url = url
+        self._cache = cache
+        self._key = key
+        self._path = parse.urlsplit(url).path
+        self._pool = ConnectionPool(url, workers, connect_timeout, read_timeout)
+        self._retries = retries
+        self._backoff = backoff
+        self._max_delay = max_delay
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="deepl"
         )
+        self._batch_window = batch_window
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._flush_timer = None
 
+    def _delay(self, attempt, resp=None):
+        """Seconds to wait before retrying, or None to give up"""
+        retry_after = resp and resp.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            delay = int(retry_after)
+            return delay if delay <= self._max_delay else None
+        return min(self._backoff * 2**attempt, self._max_delay)
 
-def _fetch(text, url, key):
-    """Makes HTTP POST request to DeepL translation API, returns JSON string"""
-    data = parse.urlencode(
-        {"auth_key": key, "text": text, "target_lang": "EN", "source_lang": "JA"}
-    ).encode()
-    req = request.Request(url, data=data)
-    try:
-        resp = request.urlopen(req)
-    except HTTPError as e:
-        _logger.error(f"{deepl_error_message} Response: HTTP {e.status}, {e.reason}")
-    except URLError as e:
-        _logger.error(f"{deepl_error_message} Caught URLError: {e.reason}")
-    else:
-        if resp.status != 200:
+    def _fetch(self, texts):
+        """Makes HTTP POST request to DeepL translation API, returns JSON string"""
+        fields = [("auth_key", self._key)]
+        fields.extend(("text", text) for text in texts)
+        fields.extend([("target_lang", "EN"), ("source_lang", "JA")])
+        data = parse.urlencode(fields).encode()
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        for attempt in range(self._retries + 1):
+            last_attempt = attempt == self._retries
+            try:
+                resp = self._pool.request("POST", self._path, data, headers)
+            except (OSError, HTTPException) as e:
+                _logger.error(f"{deepl_error_message} Caught {type(e).__name__}: {e}")
+                if last_attempt:
+                    return None
+                time.sleep(self._delay(attempt))
+                continue
+            if resp.status == 200:
+                return resp.body
             _logger.error(
                 f"{deepl_error_message} Response: HTTP {resp.status}, {resp.reason}"
             )
-        return resp.read()
+            if resp.status not in RETRY_STATUSES or last_attempt:
+                return None
+            delay = self._delay(attempt, resp)
+            if delay is None:
+                _logger.error(f"{deepl_error_message} Retry-After too long, giving up")
+                return None
+            time.sleep(delay)
+
+    def translate_many(self, texts):
+        """Translates texts in as few requests as possible, returns list of translated strings"""
+        translations = [None] * len(texts)
+        misses = {}
+        for i, text in enumerate(texts):
+            if self._cache is not None:
+                translations[i] = self._cache.get(text)
+            if translations[i] is None:
+                misses.setdefault(text, []).append(i)
+        if self._cache is not None and len(misses) < len(texts):
+            _logger.debug("translation cache hit rate %.2f", self._cache.hit_rate())
+        unique = list(misses)
+        for start in range(0, len(unique), MAX_BATCH_TEXTS):
+            chunk = unique[start : start + MAX_BATCH_TEXTS]
+            with metrics.timer("translate"):
+                results = _parse(self._fetch(chunk), len(chunk))
+            for text, translation in zip(chunk, results):
+                if self._cache is not None:
+                    self._cache.put(text, translation)
+                for i in misses[text]:
+                    translations[i] = translation
+        return translations
+
+    def translate(self, text):
+        """Fetch from DeepL API (or the cache) and parse result, returns translated string"""
+        return self.translate_many([text])[0]
+
+    def submit(self, text):
+        """Queues text for the next batch, returns a Future of the translated string"""
+        future = Future()
+        if self._cache is not None:
+            translation = self._cache.get(text)
+            if translation is not None:
+                future.set_result(translation)
+                return future
+        with self._pending_lock:
+            self._pending.append((text, future))
+            if len(self._pending) >= MAX_BATCH_TEXTS:
+                self._flush_locked()
+            elif self._flush_timer is None:
+                self._flush_timer = threading.Timer(self._batch_window, self._flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+        return future
+
+    def _flush(self):
+        with self._pending_lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            self._executor.submit(self._send, batch)
+
+    def _send(self, batch):
+        # skip texts whose callers gave up while they were queued:
+        batch = [
+            (text, future)
+            for text, future in batch
+            if future.set_running_or_notify_cancel()
+        ]
+        if not batch:
+            return
+        _logger.debug("translating batch of %d", len(batch))
+        try:
+            translations = self.translate_many([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), translation in zip(batch, translations):
+            future.set_result(translation)
+
+    def close(self):
+        self._flush()
+        self._executor.shutdown(wait=False)
+        self._pool.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+_cache = TranslationCache()
+
+
+def configure_cache(path=None, max_entries=50_000):
+    """Sets up the shared translation cache, persisted at path. max_entries of 0 disables it"""
+    global _cache
+    with _clients_lock:
+        _cache = TranslationCache(path, max_entries) if max_entries else None
+        _clients.clear()
+    return _cache
+
+
+def get_cache():
+    return _cache
+
+
+def get_client(url, key):
+    """Returns the shared client for this DeepL URL and key"""
+    with _clients_lock:
+        client = _clients.get((url, key))
+        if client is None:
+            client = DeepLClient(url, key, cache=_cache)
+            _clients[(url, key)] = client
+        return client
+
+
+def translate_async(text, url, key, cancel=None):
+    """
+    Starts a translation, returns a Future of the translated string.
+    If cancel is cancelled before the request is sent, the text is left out of it
+    """
+    future = get_client(url, key).submit(text)
+    if cancel:
+        cancel.on_cancel(future.cancel)
+    return future
+
+
+def translate_many(texts, url, key):
+    """Translates several texts in batched requests, returns list of translated strings"""
+    return get_client(url, key).translate_many(texts)
 
 
 def translate(text, url, key):
     """Fetch from DeepL API and parse result, returns translated string"""
-    json = _fetch(text, url, key)
-    translation = _parse(json)
-    return translation
+    return get_client(url, key).translate(text)
@@ -1,15 +1,31 @@
 import logging
 from dataclasses import dataclass
+from functools import cached_property
+from operator import attrgetter
 
-import sudachipy
+import numpy as np
 import skia
 
 from zoritori.strings import katakana_to_hiragana, all_kana, is_ascii
+from zoritori.spatial import TokenIndex
 
 
 _logger = logging.getLogger("zoritori")
 
 
+@dataclass(frozen=True)
+class OcrSettings:
+    """Speed/accuracy trade-offs for recognizers, engines ignore what they don't support"""
+
+    lang: str = "jpn"
+    page_mode: int = None
+    scale: float = 1.0
+
+    @classmethod
+    def from_options(cls, options):
+        return cls(options.TesseractLang, options.TesseractPageMode, options.OcrScale)
+
+
 @dataclass
 class Root:
     """Origin parent context for boxes"""
@@ -23,18 +39,43 @@ class Root:
 class Box:
     """Generic rectangular box"""
 
+    __slots__ = (
+        "_left",
+        "_top",
+        "_width",
+        "_height",
+        "_parent_context",
+        "_screenx",
+        "_screeny",
+        "_clientx",
+        "_clienty",
+    )
+
     def __init__(self, left, top, width, height, parent_context=None):
         self._left = left
         self._top = top
         self._width = width
         self._height = height
         self._parent_context = parent_context
+        # resolve absolute coordinates once, rather than walking the parent on every access:
+        if parent_context:
+            self._screenx = parent_context.screenx + left
+            self._screeny = parent_context.screeny + top
+            self._clientx = parent_context.clientx + left
+            self._clienty = parent_context.clienty + top
+        else:
+            self._screenx = left
+            self._screeny = top
+            self._clientx = left
+            self._clienty = top
 
     def __repr__(self):
         return f"zoritori.Box<{self._left, self._top, self._width, self._height}>"
 
     def to_skia_rect(self):
-        return skia.Rect.MakeXYWH(self.clientx, self.clienty, self.width, self.height)
+        return skia.Rect.MakeXYWH(
+            self._clientx, self._clienty, self._width, self._height
+        )
 
     @property
     def context(self):
@@ -42,31 +83,19 @@ class Box:
 
     @property
     def screenx(self):
-        if self._parent_context:
-            return self._parent_context.screenx + self._left
-        else:
-            return self._left
+        return self._screenx
 
     @property
     def screeny(self):
-        if self._parent_context:
-            return self._parent_context.screeny + self._top
-        else:
-            return self._top
+        return self._screeny
 
     @property
     def clientx(self):
-        if self._parent_context:
-            return self._parent_context.clientx + self._left
-        else:
-            return self._left
+        return self._clientx
 
     @property
     def clienty(self):
-        if self._parent_context:
-            return self._parent_context.clienty + self._top
-        else:
-            return self._top
+        return self._clienty
 
     @property
     def x(self):
@@ -93,6 +122,14 @@ class Box:
         return self._height
 
 
+def _delegate_to_box(cls):
+    """Class decorator that exposes the public Box attributes of `self.box` on cls"""
+    for name in dir(Box):
+        if not name.startswith("_"):
+            setattr(cls, name, property(attrgetter("box." + name)))
+    return cls
+
+
 @dataclass
 class Furigana:
     reading: str
@@ -107,6 +144,7 @@ class Furigana:
         return self.box.clienty
 
 
+@_delegate_to_box
 @dataclass
 class CharacterData:
     """OCR data for a single character"""
@@ -116,14 +154,8 @@ class CharacterData:
     conf: float
     box: Box
 
-    def __getattr__(self, name):
-        box_methods = [f for f in dir(Box) if not f.startswith("_")]
-        if name in box_methods:
-            return getattr(self.box, name)
-        else:
-            raise AttributeError
-
 
+@_delegate_to_box
 @dataclass
 class BlockData:
     """OCR data for a block of text"""
@@ -134,12 +166,80 @@ class BlockData:
     def char_count(self):
         return sum(map(lambda line: len(line), self.lines))
 
-    def __getattr__(self, name):
-        box_methods = [f for f in dir(Box) if not f.startswith("_")]
-        if name in box_methods:
-            return getattr(self.box, name)
-        else:
-            raise AttributeError
+
+class FrozenMorpheme:
+    """Plain copy of a Sudachi Morpheme, detached from its MorphemeList so it can be cached or pickled"""
+
+    __slots__ = (
+        "_begin",
+        "_end",
+        "_surface",
+        "_dictionary_form",
+        "_reading_form",
+        "_normalized_form",
+        "_part_of_speech",
+    )
+
+    def __init__(
+        self,
+        begin,
+        end,
+        surface,
+        dictionary_form,
+        reading_form,
+        normalized_form,
+        part_of_speech,
+    ):
+        self._begin = begin
+        self._end = end
+        self._surface = surface
+        self._dictionary_form = dictionary_form
+        self._reading_form = reading_form
+        self._normalized_form = normalized_form
+        self._part_of_speech = tuple(part_of_speech)
+
+    @classmethod
+    def from_morpheme(cls, m):
+        return cls(
+            m.begin(),
+            m.end(),
+            m.surface(),
+            m.dictionary_form(),
+            m.reading_form(),
+            m.normalized_form(),
+            m.part_of_speech(),
+        )
+
+    def __getstate__(self):
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __setstate__(self, state):
+        for slot, value in zip(self.__slots__, state):
+            setattr(self, slot, value)
+
+    def __repr__(self):
+        return f"zoritori.FrozenMorpheme<{self._surface}>"
+
+    def begin(self):
+        return self._begin
+
+    def end(self):
+        return self._end
+
+    def surface(self):
+        return self._surface
+
+    def dictionary_form(self):
+        return self._dictionary_form
+
+    def reading_form(self):
+        return self._reading_form
+
+    def normalized_form(self):
+        return self._normalized_form
+
+    def part_of_speech(self):
+        return self._part_of_speech
 
 
 class MergedName:
@@ -168,41 +268,75 @@ class MergedName:
         return ("名詞", "固有名詞", "人名", "姓名", "*", "*")
 
 
-class Token:
-    """Wrapper around a Sudachi Morpheme, providing some utilities"""
+def _has_kanji(surface, part_of_speech):
+    if part_of_speech[1] == "数詞":
+        return False
+    if part_of_speech[0] == "補助記号":
+        return False
+    if part_of_speech[0] == "空白":
+        return False
+    if is_ascii(surface):
+        return False
+    if all_kana(surface):
+        return False
+    return True
+
 
-    def __init__(self, sudachi_morpheme, line_num, char_num, cdata):
-        self._morpheme = sudachi_morpheme
+class Token:
+    """A morpheme placed on the screen, with its Sudachi fields extracted up front"""
+
+    __slots__ = (
+        "_surface",
+        "_dictionary_form",
+        "_reading_form",
+        "_part_of_speech",
+        "_has_kanji",
+        "_line_num",
+        "_char_num",
+        "_length",
+        "_first",
+        "_last",
+        "_box",
+        "_furigana",
+    )
+
+    def __init__(self, morpheme, line_num, char_num, cdata):
+        # copy what drawing, hover and vocabulary need, rather than holding
+        # on to the morpheme (and the MorphemeList behind it):
+        self._surface = morpheme.surface()
+        self._dictionary_form = morpheme.dictionary_form()
+        self._reading_form = katakana_to_hiragana(morpheme.reading_form())
+        self._part_of_speech = tuple(morpheme.part_of_speech())
+        self._has_kanji = _has_kanji(self._surface, self._part_of_speech)
         self._line_num = line_num
         self._char_num = char_num
-        self._cdata = cdata
-        self._sudachi_methods = [
-            f for f in dir(sudachipy.Morpheme) if not f.startswith("_")
-        ]
+        self._length = morpheme.end() - morpheme.begin()
+        self._first = cdata[0]
+        self._last = cdata[-1]
+        self._box = None
+        self._furigana = None
 
     def box(self):
-        context = self._cdata[0].context
-        left = self._cdata[0].left
-        top = self._cdata[0].top
-        height = self._cdata[0].height
-        width = self._cdata[-1].left + self._cdata[-1].width - left
-        return Box(left, top, width, height, context)
+        if self._box is None:
+            first = self._first
+            left = first.left
+            width = self._last.left + self._last.width - left
+            self._box = Box(left, first.top, width, first.height, first.context)
+        return self._box
 
     def furigana(self):
-        line_num = self.line_num()
-        char_num = self.char_num()
-        length = self.length()
-        reading = self.reading_form()
-        first = self.first()
-        last = self.last()
-        left = first.left
-        right = last.left + last.width
-        x = left + (right - left) / 2
-        y = first.top
-        box = Box(
-            x, y, None, None, first.context
-        )  # TODO: consider adding a Point class instead
-        return Furigana(reading, box)
+        if self._furigana is None:
+            first = self._first
+            last = self._last
+            left = first.left
+            right = last.left + last.width
+            x = left + (right - left) / 2
+            y = first.top
+            box = Box(
+                x, y, None, None, first.context
+            )  # TODO: consider adding a Point class instead
+            self._furigana = Furigana(self._reading_form, box)
+        return self._furigana
 
     def line_num(self):
         return self._line_num
@@ -211,47 +345,76 @@ class Token:
         return self._char_num
 
     def first(self):
-        return self._cdata[0]
+        return self._first
 
     def last(self):
-        return self._cdata[-1]
+        return self._last
 
     def length(self):
-        return self._morpheme.end() - self._morpheme.begin()
-
-    def __getattr__(self, name):
-        if name in self._sudachi_methods:
-            return getattr(self._morpheme, name)
-        else:
-            raise AttributeError
+        return self._length
 
     def __repr__(self):
-        return f"zoritori.Token<{self._morpheme.surface()}>"
+        return f"zoritori.Token<{self._surface}>"
 
-    def length(self):
-        return self._morpheme.end() - self._morpheme.begin()
+    def surface(self):
+        return self._surface
+
+    def dictionary_form(self):
+        return self._dictionary_form
 
     def part_of_speech(self, index=None):
-        if index:
-            return self._morpheme.part_of_speech()[index]
+        if index is not None:
+            return self._part_of_speech[index]
         else:
-            return self._morpheme.part_of_speech()
+            return self._part_of_speech
 
     def reading_form(self):
-        return katakana_to_hiragana(self._morpheme.reading_form())
+        return self._reading_form
 
     def has_kanji(self):
-        if self._morpheme.part_of_speech()[1] == "数詞":
-            return False
-        if self._morpheme.part_of_speech()[0] == "補助記号":
-            return False
-        if self._morpheme.part_of_speech()[0] == "空白":
-            return False
-        if is_ascii(self._morpheme.surface()):
-            return False
-        if all_kana(self._morpheme.surface()):
-            return False
-        return True
+        return self._has_kanji
+
+
+class Geometry:
+    """Boxes and confidence of many characters, packed into NumPy arrays"""
+
+    COLUMNS = (
+        "left",
+        "top",
+        "width",
+        "height",
+        "screenx",
+        "screeny",
+        "clientx",
+        "clienty",
+    )
+
+    CLIENT_RECT = [6, 7, 2, 3]  # clientx, clienty, width, height
+
+    def __init__(self, boxes, conf):
+        self.boxes = boxes
+        self.conf = conf
+
+    def __len__(self):
+        return len(self.conf)
+
+    def column(self, name):
+        return self.boxes[:, self.COLUMNS.index(name)]
+
+    def client_rects(self):
+        """(clientx, clienty, width, height) rows, ready for drawing"""
+        return self.boxes[:, self.CLIENT_RECT]
+
+
+def pack_geometry(lines: list[list[CharacterData]]) -> Geometry:
+    fields = attrgetter(*Geometry.COLUMNS)
+    cdata = [c.box for line in lines for c in line]
+    boxes = np.array([fields(box) for box in cdata], dtype=np.float64)
+    boxes = boxes.reshape(len(cdata), len(Geometry.COLUMNS))
+    conf = np.fromiter(
+        (c.conf for line in lines for c in line), dtype=np.float64, count=len(cdata)
+    )
+    return Geometry(boxes, conf)
 
 
 class RawData:
@@ -261,6 +424,8 @@ class RawData:
         self.lines = lines
         self.blocks = blocks
         self._primary_block = None
+        self.geometry = pack_geometry(lines)
+        self._line_geometry = None
 
     def _find_primary_block(self):
         if self._primary_block:
@@ -292,6 +457,16 @@ class RawData:
         else:
             return self.lines
 
+    def get_line_geometry(self):
+        """Packed geometry for the characters returned by get_lines"""
+        if self._line_geometry is None:
+            lines = self.get_lines()
+            if lines is self.lines:
+                self._line_geometry = self.geometry
+            else:
+                self._line_geometry = pack_geometry(lines)
+        return self._line_geometry
+
 
 @dataclass
 class RichData:
@@ -302,3 +477,9 @@ class RichData:
     cdata: list[list[CharacterData]]
     tokens: list[Token]
     raw_data: RawData
+    quality: "QualityReport" = None
+
+    @cached_property
+    def token_index(self) -> TokenIndex:
+        """Spatial index over token boxes, for hover hit testing"""
+        return TokenIndex(self.tokens)
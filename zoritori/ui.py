@@ -14,6 +14,7 @@ from zoritori.overlay import Overlay
 from zoritori.screenshots import take_screenshots, take_watch_screenshot, screen_changed
 from zoritori.vocabulary import save_vocabulary
 from zoritori.watcher import Watcher
+from zoritori.interactive import InteractiveLoop, View
 from zoritori.settings import get_settings_path
 
 
@@ -28,10 +29,17 @@ def main_loop(options, recognizer):
             working_dir = options.NotesFolder
         else:
             working_dir = temp_dir
-        watcher = Watcher(options, recognizer, event_queue, overlay, working_dir, get_settings_path())
+        view = View(options, overlay)
+        watcher = Watcher(
+            options, recognizer, overlay, view, working_dir, get_settings_path()
+        )
+        interactive = InteractiveLoop(options, event_queue, overlay, view, watcher)
         watcher.start()
+        interactive.start()
         try:
             overlay.ui_loop()
         finally:
+            interactive.stop()
             watcher.stop()
+        interactive.join()
         watcher.join()
@@ -0,0 +1,268 @@
+import json
+import logging
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from zoritori.batch import Batch, record_path, write_json
+from zoritori.settings import get_settings_path, load_clips
+
+
+_logger = logging.getLogger("zoritori")
+
+SAMPLE_FPS = 4.0
+# samples the region has to hold still for, so text that types out has finished:
+SETTLE = 2
+# frames are compared at this width, which is plenty to see text change:
+COMPARE_WIDTH = 320
+# a pixel changed if it moved by more than this (0-255), which ignores compression noise:
+PIXEL_THRESHOLD = 32
+# and a frame changed if more than this share of its pixels did:
+CHANGED_RATIO = 0.003
+# regions with less contrast than this (standard deviation) have no text to read:
+MIN_CONTRAST = 8.0
+
+
+def _changed(a, b):
+    moved = cv2.absdiff(a, b) > PIXEL_THRESHOLD
+    return np.count_nonzero(moved) > CHANGED_RATIO * moved.size
+
+
+def _small(frame):
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    height, width = gray.shape
+    if width <= COMPARE_WIDTH:
+        return gray
+    size = (COMPARE_WIDTH, max(1, round(height * COMPARE_WIDTH / width)))
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+
+class SceneSampler:
+    """
+    Picks the samples where a region settled into new content: after a change it has
+    to hold still for settle samples, then differ from the last picked sample and not
+    be blank. Feed it downscaled grayscale samples in order
+    """
+
+    START = "start"
+    END = "end"
+
+    def __init__(self, settle=SETTLE):
+        self._settle = settle
+        self._previous = None
+        self._stable = 0
+        self._picked = None
+        self._showing = False
+
+    def feed(self, small):
+        """Returns START when this sample should be picked, END when the picked content went away"""
+        moved = self._previous is None or _changed(self._previous, small)
+        self._previous = small
+        if self._showing and _changed(self._picked, small):
+            self._showing = False
+            event = self.END
+        else:
+            event = None
+
+        self._stable = 0 if moved else self._stable + 1
+        if event or self._stable < self._settle or self._showing:
+            return event
+        if self._picked is not None and not _changed(self._picked, small):
+            # back to what was picked last, e.g. after a flash:
+            self._showing = True
+            return None
+        if small.std() < MIN_CONTRAST:
+            return None
+        self._picked = small
+        self._showing = True
+        return self.START
+
+
+@dataclass
+class Segment:
+    """Where picked content was on screen, in seconds"""
+
+    start: float
+    end: float
+    image: Path
+
+
+def parse_region(s):
+    """Parses x,y,w,h"""
+    x, y, w, h = (int(v) for v in s.split(","))
+    return (x, y, w, h)
+
+
+def saved_region():
+    """The primary clip saved by the overlay, as x,y,w,h in screen coordinates"""
+    clip = load_clips(get_settings_path())
+    if clip:
+        return (clip.screenx, clip.screeny, clip.width, clip.height)
+    return None
+
+
+def _timestamp(seconds):
+    ms = round(seconds * 1000)
+    hours, ms = divmod(ms, 3_600_000)
+    minutes, ms = divmod(ms, 60_000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{ms:03d}"
+
+
+def to_srt(subtitles):
+    blocks = []
+    for i, subtitle in enumerate(subtitles, 1):
+        lines = [subtitle["text"]]
+        if subtitle.get("translation"):
+            lines.append(subtitle["translation"])
+        timing = f"{_timestamp(subtitle['start'])} --> {_timestamp(subtitle['end'])}"
+        blocks.append("\n".join([str(i), timing, *lines]))
+    return "\n\n".join(blocks) + "\n"
+
+
+class Video:
+    """
+    Reads text out of a recorded video: samples frames at sample_fps, crops them to
+    region, and OCRs only the ones where the region settled into new content (as a
+    batch, in parallel). Writes timestamped subtitles as SRT and JSON, plus vocabulary
+    """
+
+    def __init__(
+        self,
+        options,
+        path,
+        output=None,
+        region=None,
+        sample_fps=SAMPLE_FPS,
+        settle=SETTLE,
+        workers=None,
+        recognizer=None,
+    ):
+        self._options = options
+        self._path = Path(path)
+        self._output = (
+            Path(output)
+            if output
+            else self._path.with_name(self._path.stem + "-zoritori")
+        )
+        self._region = region
+        self._sample_fps = sample_fps
+        self._settle = settle
+        self._workers = workers
+        self._recognizer = recognizer
+
+    def _crop(self, frame):
+        if not self._region:
+            return frame
+        x, y, w, h = self._region
+        return frame[max(0, y) : y + h, max(0, x) : x + w]
+
+    def samples(self):
+        """Yields (seconds, cropped frame) for each sampled frame"""
+        capture = cv2.VideoCapture(str(self._path))
+        if not capture.isOpened():
+            raise ValueError(f"can't read video {self._path}")
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        step = max(1, round(fps / self._sample_fps))
+        try:
+            index = 0
+            while True:
+                # grab skips decoding into an image, for the frames that aren't sampled:
+                if index % step:
+                    if not capture.grab():
+                        break
+                else:
+                    ok, frame = capture.read()
+                    if not ok:
+                        break
+                    yield index / fps, self._crop(frame)
+                index += 1
+        finally:
+            capture.release()
+
+    def select(self):
+        """Saves the frames where the region settled into new content, returns their segments"""
+        frames = self._output / "frames"
+        frames.mkdir(parents=True, exist_ok=True)
+        sampler = SceneSampler(self._settle)
+        segments = []
+        seconds = 0.0
+        for seconds, frame in self.samples():
+            event = sampler.feed(_small(frame))
+            if event == SceneSampler.END:
+                segments[-1].end = seconds
+            elif event == SceneSampler.START:
+                image = frames / f"{round(seconds * 1000):09d}.png"
+                # an existing frame is left alone, so a resumed run doesn't OCR it again:
+                if not image.exists():
+                    cv2.imwrite(str(image), frame)
+                segments.append(Segment(seconds, None, image))
+        if segments and segments[-1].end is None:
+            segments[-1].end = seconds
+        return segments
+
+    def _subtitles(self, segments):
+        """Pairs segments with their OCR records, merging neighbours with the same text"""
+        subtitles = []
+        for segment in segments:
+            path = self._output / record_path(segment.image).name
+            if not path.exists():
+                continue
+            record = json.loads(path.read_text(encoding="utf-8"))
+            if not record.get("text"):
+                continue
+            if subtitles and subtitles[-1]["text"] == record["text"]:
+                subtitles[-1]["end"] = round(segment.end, 3)
+                continue
+            subtitles.append(
+                {
+                    "start": round(segment.start, 3),
+                    "end": round(segment.end, 3),
+                    "text": record["text"],
+                    "translation": record.get("translation"),
+                    "image": segment.image.name,
+                }
+            )
+        return subtitles
+
+    def run(self):
+        """Selects frames, OCRs them and writes subtitles, returns the summary"""
+        started = time.perf_counter()
+        segments = self.select()
+        selecting = time.perf_counter() - started
+        _logger.info(
+            "picked %d frames from %s in %.1fs", len(segments), self._path, selecting
+        )
+
+        summary = Batch(
+            self._options,
+            self._output / "frames",
+            self._output,
+            self._workers,
+            self._recognizer,
+        ).run()
+
+        subtitles = self._subtitles(segments)
+        write_json(self._output / "subtitles.json", subtitles)
+        (self._output / "subtitles.srt").write_text(to_srt(subtitles), encoding="utf-8")
+        summary["subtitles"] = len(subtitles)
+        summary["selecting_seconds"] = round(selecting, 3)
+        write_json(self._output / "summary.json", summary)
+        _logger.info("wrote %d subtitles to %s", len(subtitles), self._output)
+        return summary
+
+
+def run(options, path, recognizer=None):
+    region = parse_region(options.VideoRegion) if options.VideoRegion else None
+    return Video(
+        options,
+        path,
+        options.OutputFolder,
+        region or saved_region(),
+        options.SampleFps,
+        workers=options.Workers,
+        recognizer=recognizer,
+    ).run()
@@ -27,9 +27,14 @@ def _is_vocab(token):
     )
 
 
+def vocabulary_words(tokens):
+    """Dictionary forms of the tokens worth studying"""
+    return [t.dictionary_form() for t in tokens if _is_vocab(t)]
+
+
 def save_vocabulary(folder, tokens, img_path=None):
     path = get_path(folder, "vocabulary", "md", dated=False)
-    words = [t.dictionary_form() for t in tokens if _is_vocab(t)]
+    words = vocabulary_words(tokens)
     words = _filter_seen_vocab(folder, words)
     if len(words) == 0:
         return False
@@ -3,188 +3,132 @@ import os
 import threading
 import queue
 import time
-import webbrowser
-import argparse
 from pathlib import Path
 from math import trunc
-from dataclasses import dataclass
-
-import glfw
-import skia
 
 from zoritori.overlay import Overlay
-from zoritori.drawing import draw
 from zoritori.screenshots import (
     take_screenshots,
     take_watch_screenshot,
     screen_changed,
     take_screenshot_clip_only,
 )
-from zoritori.pipeline import process_image, process_image_light
+from zoritori.pipeline import Frame, build_pipeline, quick_lookup
+from zoritori.governor import LatencyGovernor, default_levels
 from zoritori.vocabulary import save_vocabulary
 from zoritori.strings import is_punctuation
 from zoritori.files import load_json, save_json
-from zoritori.types import RichData, Box, Token
 from zoritori.settings import save_clips, load_clips
 import zoritori.dictionary as dictionary
-
-
-@dataclass
-class RenderState:
-    """Snapshot of app state that gets drawn to the screen"""
-
-    options: argparse.Namespace
-    primary_data: RichData
-    primary_clip: Box
-    secondary_data: list[str]
-    secondary_clip: Box
-    hover: Token
-    hover_lookup: list[str]
+import zoritori.metrics as metrics
+import zoritori.profiling as profiling
 
 
 class Watcher(threading.Thread):
-    def __init__(self, options, recognizer, event_queue, overlay, watch_dir, settings_path):
-        threading.Thread.__init__(self)
+    """
+    Background loop that watches the screen and runs clips through OCR, publishing
+    results to the view. Input is handled elsewhere and arrives as requests
+    """
+
+    def __init__(self, options, recognizer, overlay, view, watch_dir, settings_path):
+        threading.Thread.__init__(self, name="watcher")
         self._stop_flag = threading.Event()
         self._WATCH_MARGIN = 5  # TODO: magic number
+        self._WATCH_INTERVAL = 0.5  # seconds between checks for screen changes
         self._logger = logging.getLogger("zoritori")
 
         self._options = options
         self._recognizer = recognizer
-        self._event_queue = event_queue
         self._overlay = overlay
+        self._view = view
 
         self._watch_paths = None
         self._watch_dir = watch_dir
         self._watch_regions = None
-        self._last_sdata = None
-        self._last_hover = None
-        self._last_hover_lookup = None
         self._saved_clip = None
         self._saved_clip_dirty = True
         self._secondary_clip = None
         self._settings_path = settings_path
-        self._render_state = None
+        self._last_watch_check = 0
+        self._pipeline = None
+        # clip requests and pipeline results, all handled on this thread:
+        self._requests = queue.Queue()
 
     def stop(self):
         self._stop_flag.set()
 
-    def _handle_event(self, event):
-        """Handles input events from the overlay"""
-        if not event:
-            return False
-        clip = event.get_clip()
-        key = event.get_key()
-        if clip and (key == glfw.KEY_R or key == glfw.MOUSE_BUTTON_1):
-            self._logger.debug(f"watcher got primary clip event: {clip}")
-            self._saved_clip = clip
-            self._saved_clip_dirty = True
-            return True
-        if clip and (key == glfw.KEY_Q or key == glfw.MOUSE_BUTTON_2):
-            self._logger.debug(f"watcher got secondary clip event: {clip}")
-            self._secondary_clip = clip
-            self._saved_clip_dirty = False
-            return True
-        elif key:
-            self._logger.debug(f"watcher got key event: {key}")
-            return self._handle_key(key)
-        else:
-            self._logger.debug(f"watcher got unknown event: {event}")
-            return False
+    def set_primary_clip(self, clip):
+        self._requests.put(("primary", clip))
 
-    def _open_search(self, url):
-        if self._last_hover:
-            search_term = self._last_hover.surface()
-        elif self._last_sdata:
-            search_term = self._last_sdata.original
-        if search_term:
-            webbrowser.open(url + search_term)
-
-    def _handle_key(self, key):
-        match key:
-            case glfw.KEY_C:
-                self._overlay.clear()
-                return True
-            case glfw.KEY_D:
-                self._options.debug = not self._options.debug
-                return True
-            case glfw.KEY_T:
-                self._options.Translate = not self._options.Translate
+    def set_secondary_clip(self, clip):
+        self._requests.put(("secondary", clip))
+
+    def refresh(self):
+        """Reprocesses the current clip, e.g. after an option changed"""
+        self._requests.put(("refresh", None))
+
+    def _handle_request(self, request):
+        """Returns True if the clips need processing again"""
+        (kind, value) = request
+        match kind:
+            case "primary":
+                self._saved_clip = value
+                self._saved_clip_dirty = True
                 return True
-            case glfw.KEY_J:
-                self._open_search("http://jisho.org/search/")
-                return False
-            case glfw.KEY_W:
-                self._open_search("https://ja.wikipedia.org/wiki/")
-                return False
-            case glfw.KEY_E:
-                self._open_search("https://en.wikipedia.org/w/index.php?search=")
-                return False
-            case glfw.KEY_MINUS:
-                self._options.FuriganaSize = self._options.FuriganaSize - 1
+            case "secondary":
+                self._secondary_clip = value
+                self._saved_clip_dirty = False
                 return True
-            case glfw.KEY_EQUAL:
-                self._options.FuriganaSize = self._options.FuriganaSize + 1
+            case "refresh":
                 return True
-            case _:
-                return False
+            case "result":
+                self._handle_result(value)
+            case "translation":
+                # only the view changes, the frame is already watched:
+                self._view.publish(self._saved_clip, value)
+        return False
 
     def _process(self):
-        """Take a fresh screenshot and process it. if relevant, trigger drawing and update watch"""
-
-        self._render_state = RenderState(
-            self._options,
-            None,
-            None,
-            None,
-            None,
-            None,
-            None,
-        )
-        should_draw = False
+        """Take a fresh screenshot and process it. if relevant, publish results and update watch"""
 
         if self._secondary_clip:
-            path = take_screenshot_clip_only(self._watch_dir, self._secondary_clip)
-            sdata = process_image_light(path, self._options, self._recognizer, self._secondary_clip)
-            if sdata and len(sdata.original) > 0:
-                self._logger.debug("secondary clip: %s", sdata.original)
-                self._render_state.secondary_data = dictionary.lookup(sdata.original)
-                self._render_state.secondary_clip = self._secondary_clip
-                self._render_state.primary_clip = self._saved_clip
-                self._render_state.primary_data = self._last_sdata
-                should_draw = True
+            with metrics.timer("capture"):
+                path = take_screenshot_clip_only(self._watch_dir, self._secondary_clip)
+            lookup = quick_lookup(
+                path, self._options, self._recognizer, self._secondary_clip
+            )
+            if lookup:
+                self._view.publish_secondary(self._secondary_clip, lookup)
             self._secondary_clip = None
 
         if self._saved_clip and self._saved_clip_dirty:
-            (full_path, text_path) = take_screenshots(self._watch_dir, self._saved_clip)
-            sdata = process_image(
-                self._options,
-                self._recognizer,
-                full_path,
-                text_path,
-                self._saved_clip,
-            )
-            if sdata:
-                self._last_sdata = sdata
-                self._update_watch()
-                self._render_state.primary_clip = self._saved_clip
-                self._render_state.primary_data = sdata
-                should_draw = True
-        if should_draw:
-            self._overlay.draw(lambda c: draw(c, self._render_state))
-
-
-    def _update_hover(self):
-        """Check if the mouse cursor is hovering over a token, and if so save the token"""
-        if self._saved_clip and self._last_sdata:
-            hover = self._find_hover(self._last_sdata.tokens)
-            if hover != self._last_hover:
-                self._last_hover = hover
-                entry = dictionary.lookup(hover.surface()) if hover else None
-                self._logger.debug(f"hovered token: %s", entry)
-                self._last_hover_lookup = entry
-                return True
-        return False
+            with metrics.timer("capture"):
+                (full_path, text_path) = take_screenshots(
+                    self._watch_dir, self._saved_clip
+                )
+            # results come back as requests, drawn as each stage lands:
+            self._pipeline.submit(Frame(full_path, text_path, self._saved_clip))
+
+    def _draw_partial(self, sdata):
+        """Draws pipeline results as each stage lands, so furigana doesn't wait for DeepL"""
+        self._view.publish_partial(self._saved_clip, sdata)
+
+    def _on_result(self, sdata):
+        self._requests.put(("result", sdata))
+
+    def _on_translation(self, sdata):
+        self._requests.put(("translation", sdata))
+
+    def _handle_result(self, sdata):
+        """Publishes a finished frame from the pipeline, and watches it for changes"""
+        if not sdata.quality.ok:
+            # nothing to show, but watch it (or the whole clip, when it's empty)
+            # so it isn't recognized again until it changes:
+            self._update_watch(sdata)
+            return
+        dictionary.prefetch(t.surface() for t in sdata.tokens)
+        self._update_watch(sdata)
+        self._view.publish(self._saved_clip, sdata)
 
     def _any_clip(self):
         return self._saved_clip or self._secondary_clip
@@ -192,31 +136,54 @@ class Watcher(threading.Thread):
     def run(self):
         """Primary watch loop, periodically takes screenshots and reprocesses text"""
 
+        with profiling.thread_scope():
+            self._run()
+
+    def _run(self):
         self._saved_clip = load_clips(self._settings_path)
+        governor = None
+        if self._options.LatencyBudgetMs:
+            governor = LatencyGovernor(
+                self._options.LatencyBudgetMs, default_levels(self._options)
+            )
+        self._pipeline = build_pipeline(
+            self._options,
+            self._recognizer,
+            self._on_result,
+            on_update=self._draw_partial,
+            on_reject=self._on_result,
+            on_translation=self._on_translation,
+            governor=governor,
+        )
 
         while not self._stop_flag.is_set():
             try:
-                event = self._event_queue.get(timeout=0.5)
+                request = self._requests.get(timeout=self._WATCH_INTERVAL)
             except queue.Empty:
-                event = None
-            dirty = self._handle_event(event)
-            changed = self._has_screen_changed()
-            if self._any_clip() and (not self._watch_paths or changed or dirty):
-                self._overlay.clear(block=True)
+                request = None
+            dirty = False
+            if request:
+                try:
+                    dirty = self._handle_request(request)
+                except Exception:
+                    self._logger.exception("Exception while handling %s", request[0])
+            now = time.monotonic()
+            watch_tick = dirty or now - self._last_watch_check >= self._WATCH_INTERVAL
+            if watch_tick:
+                self._last_watch_check = now
+            changed = watch_tick and self._has_screen_changed()
+            # without watch regions yet, wait for the frame in flight instead of resubmitting:
+            waiting = not self._watch_paths and not self._pipeline.busy()
+            if self._any_clip() and (dirty or (watch_tick and (waiting or changed))):
+                self._view.reset()
                 try:
                     self._process()
-                    self._update_hover()
-                except Exception as e:
-                    self._logger.error(
-                        "Exception while processing screenshot; %s", e.message
-                    )
+                except Exception:
+                    self._logger.exception("Exception while processing screenshot")
                     self.stop()
                     self._overlay.stop()
-            elif self._update_hover() and self._render_state:
-                self._render_state.hover = self._last_hover
-                self._render_state.hover_lookup = self._last_hover_lookup
-                self._overlay.draw(lambda c: draw(c, self._render_state))
 
+        self._pipeline.stop()
         save_clips(self._saved_clip, self._settings_path)
 
     def _get_first_non_punct(self, sdata):
@@ -271,8 +238,8 @@ class Watcher(threading.Thread):
 
         return regions
 
-    def _update_watch(self):
-        new_watch_regions = self._get_watch_regions(self._last_sdata)
+    def _update_watch(self, sdata):
+        new_watch_regions = self._get_watch_regions(sdata)
         if len(new_watch_regions) > 0:
             self._watch_regions = new_watch_regions
         else:
@@ -289,16 +256,7 @@ class Watcher(threading.Thread):
             return False
         if not self._watch_regions or not self._watch_paths:
             return False
-        return screen_changed(self._watch_dir, self._watch_paths, self._watch_regions)
-
-    def _is_mouse_inside(self, box: Box):
-        rect = skia.Rect.MakeXYWH(box.clientx, box.clienty, box.width, box.height)
-        (x, y) = self._overlay.get_mouse_pos()
-        pixel = skia.Rect.MakeXYWH(x, y, 1, 1)
-        return rect.intersect(pixel)
-
-    def _find_hover(self, tokens: list[Token]):
-        for t in tokens:
-            if self._is_mouse_inside(t.box()):
-                return t
-        return None
+        with metrics.timer("change_detection"):
+            return screen_changed(
+                self._watch_dir, self._watch_paths, self._watch_regions
+            )